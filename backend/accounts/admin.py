@@ -1,7 +1,8 @@
-
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import User, UserPermission
+from .permissions import PERMISSION_BITS, decode_permissions, encode_permissions
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -14,9 +15,33 @@ class UserAdmin(BaseUserAdmin):
         ('Custom Fields', {'fields': ('is_super_admin',)}),
     )
 
+class UserPermissionForm(forms.ModelForm):
+    """Edits the permission mask as one checkbox per (page, permission) pair"""
+    grants = forms.MultipleChoiceField(
+        choices=[(f'{page}:{permission}', f'{page} - {permission}') for page, permission in PERMISSION_BITS],
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+    )
+
+    class Meta:
+        model = UserPermission
+        fields = ['user']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial['grants'] = [f'{page}:{permission}' for page, permission in decode_permissions(self.instance.mask)]
+
+    def save(self, commit=True):
+        self.instance.mask = encode_permissions(grant.split(':') for grant in self.cleaned_data['grants'])
+        return super().save(commit)
+
 @admin.register(UserPermission)
 class UserPermissionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'page', 'permission', 'created_at']
-    list_filter = ['page', 'permission', 'created_at']
-    search_fields = ['user__email', 'page']
-    ordering = ['user', 'page']
+    form = UserPermissionForm
+    list_display = ['user', 'granted', 'updated_at']
+    search_fields = ['user__email']
+    ordering = ['user']
+
+    def granted(self, obj):
+        return ', '.join(f'{page}:{permission}' for page, permission in decode_permissions(obj.mask))
+    granted.short_description = 'Permissions'
@@ -0,0 +1,38 @@
+"""
+Async login. Credential verification runs on accounts.hashing's bounded
+pool, so under ASGI a login burst waits on the pool without holding
+server threads, and beyond the pool's queue it is refused straight away.
+Clients over the login rate limits are refused before any of that.
+"""
+import json
+from django.http import HttpResponseNotAllowed, JsonResponse
+from .hashing import Overloaded, hashing_pool
+from .http import csrf_exempt, error
+from .ratelimit import client_ip, rate_limiter, request_email
+from .views import login_result
+
+@csrf_exempt
+async def login_view(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return error('Invalid JSON', 400)
+    else:
+        data = request.POST
+
+    retry_after = await rate_limiter.ahit('login', client_ip(request), request_email(data))
+    if retry_after is not None:
+        response = error('Too many requests, try again later', 429)
+        response['Retry-After'] = str(retry_after)
+        return response
+
+    try:
+        body, status = await hashing_pool.run(login_result, data)
+    except Overloaded as exc:
+        response = error(str(exc), exc.status)
+        response['Retry-After'] = str(exc.retry_after)
+        return response
+    return JsonResponse(body, status=status)
@@ -0,0 +1,232 @@
+"""
+Supabase comment views, async so they are best served through core.asgi.
+
+All requests on a worker share one pooled async Supabase client, so many
+requests can wait on Supabase at once, and lookups that do not depend on
+each other (the token check and the comment fetch) are issued concurrently.
+Edits and deletes are checked by the Postgres functions that apply them
+(supabase/migrations/), against the caller's cached authorization.
+"""
+import asyncio
+import json
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse
+from postgrest.exceptions import APIError
+from supabase_client import get_async_supabase_client
+from .cache import TTLCache
+from .http import bearer_token, csrf_exempt, error
+from .permissions import ALL_PAGES
+from .supabase_auth import aget_authorization, aget_supabase_user_id, invalidate_authorization
+
+# Postgres error code the comment mutation functions raise when the caller may not make the change
+INSUFFICIENT_PRIVILEGE = '42501'
+
+# Short-lived {id: {email, full_name}} profiles of comment authors
+author_cache = TTLCache(
+    max_size=settings.SUPABASE_CACHE['MAX_SIZE'],
+    ttl=settings.SUPABASE_CACHE['AUTHOR_TTL'],
+)
+
+async def afetch_authors(supabase, user_ids):
+    """Resolve user ids to profiles with one `in` query for the ids not cached"""
+    authors = {}
+    missing = []
+    for user_id in set(filter(None, user_ids)):
+        author = author_cache.get(user_id)
+        if author is None:
+            missing.append(user_id)
+        else:
+            authors[user_id] = author
+    if missing:
+        response = await supabase.from_('users').select('id,email,full_name').in_('id', missing).execute()
+        for row in response.data:
+            user_id = row.pop('id')
+            author_cache.set(user_id, row)
+            authors[user_id] = row
+    return authors
+
+@csrf_exempt
+async def page_comments(request, page):
+    if request.method == 'GET':
+        return await get_comments(request, page)
+    if request.method == 'POST':
+        return await add_comment(request, page)
+    return HttpResponseNotAllowed(['GET', 'POST'])
+
+@csrf_exempt
+async def comment_detail(request, comment_id):
+    if request.method == 'PUT':
+        return await update_comment(request, comment_id)
+    if request.method == 'DELETE':
+        return await delete_comment(request, comment_id)
+    return HttpResponseNotAllowed(['PUT', 'DELETE'])
+
+@csrf_exempt
+async def comment_history(request, comment_id):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    return await get_comment_history(request, comment_id)
+
+async def get_comments(request, page):
+    try:
+        token = bearer_token(request)
+        if token is None:
+            return error('Authorization token required', 401)
+
+        # Verify the token while the comments are fetched; they are only returned if it is valid
+        supabase = await get_async_supabase_client()
+        user_id, response = await asyncio.gather(
+            aget_supabase_user_id(supabase, token),
+            supabase.from_('comments').select('*').eq('page', page).order('created_at').execute(),
+        )
+        if user_id is None:
+            return error('Invalid or expired token', 401)
+
+        comments = response.data
+        authors = await afetch_authors(supabase, [comment.get('author_id') for comment in comments])
+        for comment in comments:
+            if comment.get('author_id') in authors:
+                comment['author'] = authors[comment['author_id']]
+
+        return JsonResponse(comments, safe=False)
+    except Exception as e:
+        return error(str(e), 400)
+
+async def add_comment(request, page):
+    try:
+        token = bearer_token(request)
+        if token is None:
+            return error('Authorization token required', 401)
+
+        supabase = await get_async_supabase_client()
+        user_id = await aget_supabase_user_id(supabase, token)
+        if user_id is None:
+            return error('Invalid or expired token', 401)
+
+        # Check if user has permission to add comments (super admin or create permission)
+        if not (await aget_authorization(supabase, user_id)).has(page, 'create'):
+            return error('Permission denied', 403)
+
+        content = json.loads(request.body or b'{}').get('content')
+        if not content:
+            return error('Comment content is required', 400)
+
+        response = await supabase.from_('comments').insert({
+            'page': page,
+            'author_id': user_id,
+            'content': content
+        }).execute()
+
+        if response.data:
+            return JsonResponse(response.data[0])
+        else:
+            return error('Failed to create comment', 500)
+    except Exception as e:
+        return error(str(e), 400)
+
+async def authenticate_write(request):
+    """(supabase, user_id) of the caller, else the error response"""
+    token = bearer_token(request)
+    if token is None:
+        return error('Authorization token required', 401)
+
+    # Destructive operation: check with Supabase Auth that the session was not revoked
+    supabase = await get_async_supabase_client()
+    user_id = await aget_supabase_user_id(supabase, token, verify_remote=True)
+    if user_id is None:
+        return error('Invalid or expired token', 401)
+    return supabase, user_id
+
+async def change_comment(supabase, user_id, comment_id, permission, function, params):
+    """
+    Run a comment mutation RPC, returning the affected row or the error
+    response. The function itself checks the comment's author and page
+    against the pages the caller's cached authorization allows, so a write
+    is the Supabase Auth session check plus this one call.
+    """
+    authorization = await aget_authorization(supabase, user_id)
+    try:
+        response = await supabase.rpc(function, {
+            **params,
+            'p_comment_id': comment_id,
+            'p_modified_by': user_id,
+            'p_pages': [page for page in ALL_PAGES if authorization.has(page, permission)],
+            'p_any_page': authorization.is_super_admin,
+        }).execute()
+    except APIError as e:
+        if e.code != INSUFFICIENT_PRIVILEGE:
+            raise
+        # The snapshot may predate a grant; the next attempt loads a fresh one
+        invalidate_authorization(user_id)
+        return error('Permission denied', 403)
+
+    if not response.data:
+        return error('Comment not found', 404)
+    return response.data[0]
+
+async def update_comment(request, comment_id):
+    try:
+        authenticated = await authenticate_write(request)
+        if isinstance(authenticated, JsonResponse):
+            return authenticated
+
+        content = json.loads(request.body or b'{}').get('content')
+        if not content:
+            return error('Comment content is required', 400)
+
+        # Save previous content to history and update the comment in one call
+        comment = await change_comment(*authenticated, comment_id, 'edit', 'update_comment_with_history', {
+            'p_content': content,
+        })
+        if isinstance(comment, JsonResponse):
+            return comment
+        return JsonResponse(comment)
+    except Exception as e:
+        return error(str(e), 400)
+
+async def delete_comment(request, comment_id):
+    try:
+        authenticated = await authenticate_write(request)
+        if isinstance(authenticated, JsonResponse):
+            return authenticated
+
+        # Save to history and delete the comment in one call
+        comment = await change_comment(*authenticated, comment_id, 'delete', 'delete_comment_with_history', {})
+        if isinstance(comment, JsonResponse):
+            return comment
+        return JsonResponse({'message': 'Comment deleted successfully'})
+    except Exception as e:
+        return error(str(e), 400)
+
+async def get_comment_history(request, comment_id):
+    try:
+        token = bearer_token(request)
+        if token is None:
+            return error('Authorization token required', 401)
+
+        # Verify the token while the history is fetched; it is only returned to super admins
+        supabase = await get_async_supabase_client()
+        user_id, response = await asyncio.gather(
+            aget_supabase_user_id(supabase, token),
+            supabase.from_('comment_history')
+                .select('*')
+                .eq('comment_id', comment_id)
+                .order('created_at')
+                .execute(),
+        )
+        if user_id is None:
+            return error('Invalid or expired token', 401)
+
+        # Check if user is super admin before resolving anyone's profile
+        if not (await aget_authorization(supabase, user_id)).is_super_admin:
+            return error('Permission denied', 403)
+
+        history = response.data
+        authors = await afetch_authors(supabase, [entry.get('modified_by') for entry in history])
+        for entry in history:
+            if entry.get('modified_by') in authors:
+                entry['modified_by_user'] = authors[entry['modified_by']]
+
+        return JsonResponse(history, safe=False)
+    except Exception as e:
+        return error(str(e), 400)
@@ -0,0 +1,180 @@
+"""
+An in-process Bloom filter of blacklisted refresh-token JTIs, so checking a
+token that was never blacklisted, the common case, needs no query.
+
+A JTI the filter has never seen is certainly not blacklisted; one it has
+seen may be (a false positive, at TOKEN_BLACKLIST_FILTER['ERROR_RATE']) and
+is checked against the database as before. The filter is loaded with the
+unexpired blacklisted tokens in a background thread on first use (tokens
+are checked in the database until it is ready), picks up tokens
+blacklisted by other processes every SYNC_INTERVAL seconds (one query on
+the primary key for the new rows, and for ids skipped by earlier syncs whose
+transactions may not have committed yet), and is rebuilt the same way every
+REBUILD_INTERVAL seconds to drop expired tokens, or sooner when it holds
+more than it was sized for.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+# A row id a sync skipped over may belong to a transaction that commits later, so it is
+# re-read until it shows up or has been missing this many seconds (a rolled-back insert)
+GAP_TIMEOUT = 300
+# At most this many ids right below a row are tracked, i.e. inserts still in flight when it committed
+MAX_GAP = 1000
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: two 64-bit halves of one digest give all the positions
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, item):
+        new = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                new = True
+        # Only items that set a bit count towards capacity, so re-adding one is free
+        self.count += new
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class BlacklistFilter:
+    def __init__(self, capacity, error_rate, sync_interval, rebuild_interval):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.stats = {'skipped': 0, 'checked': 0}
+        # None until the first build finishes; every token is checked in the database until then
+        self._filter = None
+        self._last_id = 0
+        # Ids below _last_id not seen yet -> time.monotonic() they were first missed
+        self._gaps = {}
+        self._synced = 0.0
+        self._built = 0.0
+        self._building = False
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def might_be_blacklisted(self, jti):
+        bloom = self._current()
+        result = bloom is None or jti in bloom
+        with self._stats_lock:
+            self.stats['checked' if result else 'skipped'] += 1
+        return result
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+            self._synced = 0.0
+
+    def rebuild(self):
+        """Build the filter now, in this thread"""
+        with self._lock:
+            self._building = True
+        self._build()
+
+    def _current(self):
+        now = time.monotonic()
+        if now - self._synced < self.sync_interval:
+            return self._filter
+        # Whoever holds the lock is already syncing; the others use the filter as it is,
+        # unless syncing on every check (SYNC_INTERVAL 0) was asked for
+        if not self._lock.acquire(blocking=not self.sync_interval):
+            return self._filter
+        try:
+            self._synced = now
+            stale = self._filter is None or now - self._built >= self.rebuild_interval \
+                or self._filter.count > self._filter.capacity
+            if stale and not self._building:
+                self._building = True
+                threading.Thread(target=self._build, name='blacklist-filter', daemon=True).start()
+            if self._filter is not None:
+                self._last_id = self._sync(self._filter, self._last_id, self._gaps)
+            return self._filter
+        finally:
+            self._lock.release()
+
+    def _build(self):
+        """Load the unexpired blacklist into a new filter, then swap it in"""
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        try:
+            now = timezone.now()
+            # Room for the blacklist to double before the next rebuild
+            bloom = BloomFilter(
+                max(self.capacity, BlacklistedToken.objects.filter(token__expires_at__gt=now).count() * 2),
+                self.error_rate,
+            )
+            gaps = {}
+            last_id = self._sync(bloom, 0, gaps, live_after=now)
+            with self._lock:
+                # Catch up with tokens blacklisted while this one was loading
+                self._last_id = self._sync(bloom, last_id, gaps)
+                self._gaps = gaps
+                self._filter = bloom
+                self._built = time.monotonic()
+        finally:
+            self._building = False
+            if threading.current_thread().name == 'blacklist-filter':
+                connection.close()
+
+    def _sync(self, bloom, last_id, gaps, live_after=None):
+        """
+        Add the rows blacklisted after last_id, and those of the ids in `gaps`
+        that have committed since, skipping tokens that expired before
+        live_after; records the ids skipped over in `gaps` and returns the new
+        last id
+        """
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        query = Q(id__gt=last_id)
+        if gaps:
+            query |= Q(id__in=list(gaps))
+        rows = BlacklistedToken.objects.filter(query).order_by('id')\
+            .values_list('id', 'blacklisted_at', 'token__jti', 'token__expires_at')
+        now = time.monotonic()
+        # A missing id below a row older than GAP_TIMEOUT was deleted or rolled back long ago
+        recent = timezone.now() - timedelta(seconds=GAP_TIMEOUT)
+        for row_id, blacklisted_at, jti, expires_at in rows.iterator(chunk_size=10000):
+            if live_after is None or expires_at > live_after:
+                bloom.add(jti)
+            gaps.pop(row_id, None)
+            if row_id > last_id:
+                if blacklisted_at >= recent:
+                    gaps.update(dict.fromkeys(range(max(last_id + 1, row_id - MAX_GAP), row_id), now))
+                last_id = row_id
+        for gap_id, missed in list(gaps.items()):
+            if now - missed >= GAP_TIMEOUT:
+                del gaps[gap_id]
+        return last_id
+
+def blacklist_filter_from_settings():
+    options = settings.TOKEN_BLACKLIST_FILTER
+    return BlacklistFilter(options['CAPACITY'], options['ERROR_RATE'], options['SYNC_INTERVAL'], options['REBUILD_INTERVAL'])
+
+blacklist_filter = blacklist_filter_from_settings()
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire after `ttl` seconds,
+    or after their own ttl when one is given to set().
+
+    An entry may be tagged with a version; a lookup with a different version
+    misses, which is how a permissions_version bump on the user row
+    invalidates cached permission sets in every worker.
+    """
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, version=None, ttl=None):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+permission_cache = TTLCache(
+    max_size=settings.PERMISSION_CACHE['MAX_SIZE'],
+    ttl=settings.PERMISSION_CACHE['TTL'],
+)
@@ -0,0 +1,77 @@
+"""
+A dedicated, size-limited executor for password verification.
+
+Checking a PBKDF2 hash costs hundreds of milliseconds of CPU. Running it
+on LOGIN_HASHING['WORKERS'] threads caps the cores a login burst can take,
+so other endpoints keep their latency. Admission control keeps the backlog
+short: a login is refused straight away (429) when WORKERS + QUEUE_DEPTH
+are already in flight, and one that waited in the queue longer than
+QUEUE_TIMEOUT seconds is dropped (503) instead of being hashed for a
+client that has likely given up.
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+class Overloaded(Exception):
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class HashingPool:
+    def __init__(self, workers, queue_depth, queue_timeout):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hashing')
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.stats = {'accepted': 0, 'rejected': 0, 'expired': 0}
+
+    def submit(self, fn, *args):
+        """Schedule fn(*args) on the pool; raises Overloaded (429) when it is full"""
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_depth:
+                self.stats['rejected'] += 1
+                raise Overloaded('Too many login attempts in progress, try again shortly', 429, 1)
+            self._in_flight += 1
+            self.stats['accepted'] += 1
+        future = self._executor.submit(self._run, time.monotonic(), fn, args)
+        future.add_done_callback(self._done)
+        return future
+
+    def call(self, fn, *args):
+        """Run fn(*args) on the pool and wait for its result"""
+        return self.submit(fn, *args).result()
+
+    async def run(self, fn, *args):
+        """Await fn(*args) on the pool without holding a thread of the caller's"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def _run(self, queued, fn, args):
+        if time.monotonic() - queued > self.queue_timeout:
+            with self._lock:
+                self.stats['expired'] += 1
+            raise Overloaded('Login service is busy, try again shortly', 503, math.ceil(self.queue_timeout))
+        # Pool threads live for the whole process, so manage their connections like a request would
+        close_old_connections()
+        try:
+            return fn(*args)
+        finally:
+            close_old_connections()
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+def hashing_pool_from_settings():
+    options = settings.LOGIN_HASHING
+    return HashingPool(options['WORKERS'], options['QUEUE_DEPTH'], options['QUEUE_TIMEOUT'])
+
+hashing_pool = hashing_pool_from_settings()
@@ -0,0 +1,21 @@
+"""
+Helpers shared by the plain Django (non-DRF) async views.
+"""
+from django.http import JsonResponse
+
+def csrf_exempt(view):
+    """
+    Django 4.2's csrf_exempt wraps the view in a sync function, which hides
+    the coroutine from the handler, so mark the view itself instead
+    """
+    view.csrf_exempt = True
+    return view
+
+def bearer_token(request):
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ')[1]
+
+def error(message, status):
+    return JsonResponse({'error': message}, status=status)
@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from accounts.models import PasswordResetOTP
+from pages.models import CommentHistory
+
+JOBS = ['otps', 'tokens', 'history']
+DEFAULT_STATE = os.path.join(tempfile.gettempdir(), 'purge_expired.state.json')
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired password-reset OTPs, expired refresh tokens (with their blacklist entries) and comment '
+        'history older than the retention period, in small primary-key-ranged chunks. An interrupted run '
+        'resumes where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', default=','.join(JOBS), help='comma-separated subset of ' + ', '.join(JOBS))
+        parser.add_argument('--otp-hours', type=float, default=settings.RETENTION['OTP_HOURS'],
+                            help='delete OTPs created longer ago than this')
+        parser.add_argument('--history-days', type=int, default=settings.RETENTION['HISTORY_DAYS'],
+                            help='delete comment history older than this; 0 keeps it forever')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='rows per DELETE')
+        parser.add_argument('--sleep', type=float, default=0.1, help='seconds to pause between chunks')
+        parser.add_argument('--state', default=DEFAULT_STATE, help='checkpoint file used to resume')
+        parser.add_argument('--restart', action='store_true', help='ignore the checkpoint of an interrupted run')
+        parser.add_argument('--dry-run', action='store_true', help='count what would be deleted, delete nothing')
+
+    def handle(self, *args, **options):
+        jobs = [name.strip() for name in options['only'].split(',') if name.strip()]
+        unknown = set(jobs) - set(JOBS)
+        if unknown:
+            raise CommandError(f'Unknown jobs: {", ".join(sorted(unknown))}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        self.state_path = options['state']
+        self.state = {} if options['restart'] or options['dry_run'] else self.load_state()
+        now = timezone.now()
+        cutoffs = {
+            'otps': now - timedelta(hours=options['otp_hours']),
+            'tokens': now,
+            'history': now - timedelta(days=options['history_days']) if options['history_days'] else None,
+        }
+
+        for job in jobs:
+            # A resumed job keeps its original cutoff, so it finishes the same set of rows
+            checkpoint = self.state.get(job)
+            if checkpoint is not None:
+                cutoff, last_pk = datetime.fromisoformat(checkpoint['cutoff']), checkpoint['last_pk']
+                self.stdout.write(f'{job}: resuming after id {last_pk}')
+            else:
+                cutoff, last_pk = cutoffs[job], 0
+            if cutoff is None:
+                self.stdout.write(f'{job}: skipped, no retention period set')
+                continue
+            queryset = self.expired(job, cutoff)
+            if options['dry_run']:
+                self.stdout.write(f'{job}: {queryset.count()} rows older than {cutoff:%Y-%m-%d %H:%M} would be deleted')
+                continue
+            self.purge(job, queryset, cutoff, last_pk, options['chunk_size'], options['sleep'])
+
+        if not options['dry_run'] and not self.state and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def expired(self, job, cutoff):
+        if job == 'otps':
+            return PasswordResetOTP.objects.filter(created_at__lt=cutoff)
+        if job == 'tokens':
+            # Deleting an outstanding token deletes its blacklist entry too
+            return OutstandingToken.objects.filter(expires_at__lt=cutoff)
+        return CommentHistory.objects.filter(modified_at__lt=cutoff)
+
+    def purge(self, job, queryset, cutoff, last_pk, chunk_size, pause):
+        started = time.monotonic()
+        deleted = 0
+        while True:
+            # The chunk is the id range up to the chunk_size-th expired row, so the DELETE
+            # touches a bounded key range instead of carrying a list of ids
+            bounds = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[chunk_size - 1:chunk_size]
+            )
+            upper = bounds[0] if bounds else None
+            with transaction.atomic():
+                chunk = queryset.filter(pk__gt=last_pk)
+                if upper is not None:
+                    chunk = chunk.filter(pk__lte=upper)
+                # Counted without cascades, e.g. a token's blacklist entry
+                count = chunk.delete()[1].get(queryset.model._meta.label, 0)
+            deleted += count
+            if upper is None:
+                break
+            last_pk = upper
+            self.state[job] = {'cutoff': cutoff.isoformat(), 'last_pk': last_pk}
+            self.save_state()
+            self.stdout.write(f'{job}: {deleted} deleted, up to id {last_pk}', ending='\r')
+            self.stdout.flush()
+            if pause:
+                time.sleep(pause)
+        self.state.pop(job, None)
+        self.save_state()
+        self.stdout.write(self.style.SUCCESS(f'{job}: {deleted} deleted in {time.monotonic() - started:.1f}s'))
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as state:
+                return json.load(state)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            raise CommandError(f'Unreadable checkpoint {self.state_path}; rerun with --restart')
+
+    def save_state(self):
+        # Write then rename, so an interruption never leaves a half-written checkpoint
+        partial = f'{self.state_path}.partial'
+        with open(partial, 'w') as state:
+            json.dump(self.state, state)
+        os.replace(partial, self.state_path)
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# Frozen copy of accounts.permissions.PERMISSION_BITS at the time of this migration
+PAGES = [
+    'products-list', 'marketing-list', 'order-list', 'media-plans', 'offer-pricing',
+    'clients', 'suppliers', 'customer-support', 'sales-reports', 'finance',
+]
+PERMISSIONS = ['view', 'edit', 'create', 'delete']
+BITS_PER_PAGE = 4
+PERMISSION_BITS = {
+    (page, permission): 1 << (page_index * BITS_PER_PAGE + permission_index)
+    for page_index, page in enumerate(PAGES)
+    for permission_index, permission in enumerate(PERMISSIONS)
+}
+
+
+def pack_permission_rows(apps, schema_editor):
+    """Fold every (user, page, permission) row into the user's first row"""
+    UserPermission = apps.get_model('accounts', 'UserPermission')
+    masks = {}
+    keep = {}
+    for row_id, user_id, page, permission in UserPermission.objects.order_by('id').values_list(
+        'id', 'user_id', 'page', 'permission'
+    ).iterator():
+        masks[user_id] = masks.get(user_id, 0) | PERMISSION_BITS.get((page, permission), 0)
+        keep.setdefault(user_id, row_id)
+
+    first_rows = UserPermission.objects.values('user_id').annotate(first_id=models.Min('id')).values('first_id')
+    UserPermission.objects.exclude(id__in=first_rows).delete()
+    UserPermission.objects.bulk_update(
+        [UserPermission(id=row_id, mask=masks[user_id]) for user_id, row_id in keep.items()],
+        ['mask'],
+        batch_size=1000,
+    )
+
+
+def unpack_permission_rows(apps, schema_editor):
+    """Expand every mask back into one row per granted (page, permission) pair"""
+    UserPermission = apps.get_model('accounts', 'UserPermission')
+    rows = []
+    for user_id, mask, created_at in UserPermission.objects.values_list('user_id', 'mask', 'created_at').iterator():
+        rows.extend(
+            UserPermission(user_id=user_id, page=page, permission=permission, mask=0, created_at=created_at)
+            for (page, permission), bit in PERMISSION_BITS.items()
+            if mask & bit
+        )
+    UserPermission.objects.all().delete()
+    UserPermission.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_permissions_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpermission',
+            name='mask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userpermission',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterUniqueTogether(
+            name='userpermission',
+            unique_together=set(),
+        ),
+        migrations.RunPython(pack_permission_rows, unpack_permission_rows),
+        # Defaults only let the columns be re-added to a populated table when unapplying
+        migrations.AlterField(
+            model_name='userpermission',
+            name='page',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='userpermission',
+            name='permission',
+            field=models.CharField(default='', max_length=10),
+        ),
+        migrations.RemoveField(
+            model_name='userpermission',
+            name='page',
+        ),
+        migrations.RemoveField(
+            model_name='userpermission',
+            name='permission',
+        ),
+        migrations.AlterField(
+            model_name='userpermission',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='page_permissions', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -6,6 +6,8 @@ import string
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     is_super_admin = models.BooleanField(default=False)
+    # Bumped on every UserPermission change to invalidate cached permission sets
+    permissions_version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -21,6 +23,11 @@ class User(AbstractUser):
         alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
         password = ''.join(secrets.choice(alphabet) for i in range(length))
         return password
+    
+    @staticmethod
+    def bump_permissions_version(*user_ids):
+        """Invalidate every cached permission set of the given users"""
+        User.objects.filter(pk__in=user_ids).update(permissions_version=models.F('permissions_version') + 1)
 
 class UserPermission(models.Model):
     PERMISSION_CHOICES = [
@@ -43,16 +50,15 @@ class UserPermission(models.Model):
         ('finance', 'Finance & Accounting'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='permissions')
-    page = models.CharField(max_length=50, choices=PAGE_CHOICES)
-    permission = models.CharField(max_length=10, choices=PERMISSION_CHOICES)
+    # One row per user: every (page, permission) grant is a bit of `mask`,
+    # laid out by accounts.permissions.PERMISSION_BITS
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='page_permissions')
+    mask = models.BigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
-    
-    class Meta:
-        unique_together = ['user', 'page', 'permission']
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.user.email} - {self.page} - {self.permission}"
+        return f"{self.user.email} - {self.mask:#x}"
 
 class PasswordResetOTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -60,6 +66,11 @@ class PasswordResetOTP(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_used = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'otp', 'is_used'], name='otp_user_otp_used_idx'),
+        ]
+    
     def __str__(self):
         return f"OTP for {self.user.email}"
     
@@ -0,0 +1,153 @@
+from django.db import transaction
+from django.utils import timezone
+from .cache import permission_cache
+from .models import User, UserPermission
+
+ALL_PAGES = [choice[0] for choice in UserPermission.PAGE_CHOICES]
+ALL_PERMISSIONS = [choice[0] for choice in UserPermission.PERMISSION_CHOICES]
+
+# Bit positions are persisted in UserPermission.mask: new pages may only be
+# appended to PAGE_CHOICES, and a page owns BITS_PER_PAGE consecutive bits.
+BITS_PER_PAGE = 4
+PERMISSION_BITS = {
+    (page, permission): 1 << (page_index * BITS_PER_PAGE + permission_index)
+    for page_index, page in enumerate(ALL_PAGES)
+    for permission_index, permission in enumerate(ALL_PERMISSIONS)
+}
+PAGE_MASKS = {
+    page: sum(PERMISSION_BITS[(page, permission)] for permission in ALL_PERMISSIONS)
+    for page in ALL_PAGES
+}
+
+# Access token claims carrying a permission snapshot (see accounts.tokens)
+PERMISSIONS_CLAIM = 'perm'
+SUPER_ADMIN_CLAIM = 'sa'
+VERSION_CLAIM = 'pv'
+
+def encode_permissions(grants):
+    """Pack (page, permission) pairs into a mask, rejecting unknown pages and permissions"""
+    mask = 0
+    for page, permission in grants:
+        bit = PERMISSION_BITS.get((page, permission))
+        if bit is None:
+            raise ValueError(f"Unknown permission '{permission}' on page '{page}'")
+        mask |= bit
+    return mask
+
+def decode_permissions(mask):
+    """Unpack a mask into (page, permission) pairs, in PAGE_CHOICES order"""
+    return [grant for grant, bit in PERMISSION_BITS.items() if mask & bit]
+
+def encode_permission_map(permissions_data):
+    """Mask for a {page: [permissions]} payload, where a single permission may be a bare string"""
+    grants = []
+    for page, permission_list in permissions_data.items():
+        if not isinstance(permission_list, list):
+            # Single permission
+            permission_list = [permission_list]
+        grants.extend((page, permission.lower()) for permission in permission_list)
+    return encode_permissions(grants)
+
+def permission_map(mask):
+    """{page: [permissions]} view of a mask, the inverse of encode_permission_map"""
+    pages = {}
+    for page, permission in decode_permissions(mask):
+        pages.setdefault(page, []).append(permission)
+    return pages
+
+def set_permission_masks(masks):
+    """
+    Store {user_id: mask} in one transaction, touching only the rows that
+    change, and return {user_id: previous mask}
+    """
+    with transaction.atomic():
+        rows = {row.user_id: row for row in UserPermission.objects.select_for_update().filter(user_id__in=masks)}
+        previous = {user_id: rows[user_id].mask if user_id in rows else 0 for user_id in masks}
+        now = timezone.now()
+        changed_rows = []
+        new_rows = []
+        for user_id, mask in masks.items():
+            if mask == previous[user_id]:
+                continue
+            row = rows.get(user_id)
+            if row is None:
+                new_rows.append(UserPermission(user_id=user_id, mask=mask, updated_at=now))
+            else:
+                row.mask = mask
+                row.updated_at = now
+                changed_rows.append(row)
+
+        # Bulk writes skip the model signals, so invalidate explicitly
+        UserPermission.objects.bulk_update(changed_rows, ['mask', 'updated_at'], batch_size=500)
+        # A concurrent first write may insert the same user's row after the select above; upsert so the
+        # later writer wins instead of failing on the unique user
+        UserPermission.objects.bulk_create(
+            new_rows, batch_size=500, update_conflicts=True, unique_fields=['user'], update_fields=['mask', 'updated_at']
+        )
+        changed = [row.user_id for row in changed_rows + new_rows]
+        if changed:
+            User.bump_permissions_version(*changed)
+
+    for user_id in changed:
+        permission_cache.invalidate(user_id)
+    return previous
+
+def permission_entries(rows):
+    """One {user, page, permission} entry per bit set in each UserPermission row"""
+    return [
+        {'user': row.user_id, 'page': page, 'permission': permission, 'created_at': row.updated_at}
+        for row in rows
+        for page, permission in decode_permissions(row.mask)
+    ]
+
+class PagePermissionSet:
+    """
+    Resolved page x permission grants for a single user
+    """
+    def __init__(self, mask=0, is_super_admin=False):
+        self.mask = mask
+        self.is_super_admin = is_super_admin
+
+    def has(self, page, permission):
+        return self.is_super_admin or bool(self.mask & PERMISSION_BITS.get((page, permission), 0))
+
+    def has_any(self, page):
+        return self.is_super_admin or bool(self.mask & PAGE_MASKS.get(page, 0))
+
+    @property
+    def pages(self):
+        return [page for page in ALL_PAGES if self.has_any(page)]
+
+    def for_page(self, page):
+        """Permissions held on a page, in PERMISSION_CHOICES order"""
+        return [permission for permission in ALL_PERMISSIONS if self.has(page, permission)]
+
+def load_permission_set(user):
+    """Permission set of a user, from the process-wide cache or a single query"""
+    if not user or not user.is_authenticated:
+        return PagePermissionSet()
+
+    if user.is_super_admin:
+        return PagePermissionSet(is_super_admin=True)
+
+    permission_set = permission_cache.get(user.pk, user.permissions_version)
+    if permission_set is None:
+        mask = UserPermission.objects.filter(user=user).values_list('mask', flat=True).first()
+        permission_set = PagePermissionSet(mask or 0)
+        permission_cache.set(user.pk, permission_set, user.permissions_version)
+    return permission_set
+
+def permission_set_from_claims(token):
+    """Permission set embedded in an access token, or None if the token carries no claims"""
+    if token is None or PERMISSIONS_CLAIM not in token:
+        return None
+    return PagePermissionSet(token[PERMISSIONS_CLAIM], is_super_admin=token[SUPER_ADMIN_CLAIM])
+
+def get_permission_set(request):
+    """Permission set of request.user, loaded once and reused for the rest of the request"""
+    permission_set = getattr(request, '_page_permission_set', None)
+    if permission_set is None:
+        # Claims were checked against the user's permissions_version at authentication
+        permission_set = permission_set_from_claims(request.auth) or load_permission_set(request.user)
+        request._page_permission_set = permission_set
+    return permission_set
@@ -0,0 +1,192 @@
+"""
+Sliding-window rate limits for the unauthenticated auth endpoints, keyed by
+client IP and by the email in the request.
+
+Each rule keeps, per key, the count of the current and the previous fixed
+window; the sliding count is the current one plus the previous one weighted
+by how much of it still overlaps the sliding window. That is three numbers
+per key. Keys idle for two windows are swept out once per window, and past
+MAX_KEYS the least recently hit key is dropped.
+
+Counts are per process. With AUTH_RATE_LIMITS['SHARED'] they are also kept
+in the `ratelimit` cache (file- or database-backed, see CACHES), so limits
+hold across workers. The in-process counts are checked first: they never
+exceed the shared ones, so a request over the limit locally is refused
+without touching the shared store. Each count is checked and incremented
+in one step, and only admitted requests are counted.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+class SlidingWindow:
+    def __init__(self, limit, window, max_keys):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        # key -> [window index, count in that window, count in the window before]
+        self._counts = OrderedDict()
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def estimate(self, current, previous, now):
+        elapsed = now / self.window % 1
+        return current + previous * (1 - elapsed)
+
+    def retry_after(self, current, previous, now):
+        """Seconds until the sliding count drops below the limit"""
+        elapsed = now / self.window % 1
+        if previous and current < self.limit:
+            # The previous window's weight decays linearly over this one
+            fraction = 1 - (self.limit - current) / previous
+            return max(1, math.ceil((fraction - elapsed) * self.window))
+        return max(1, math.ceil((1 - elapsed) * self.window))
+
+    def counts(self, key, now):
+        """(current, previous) window counts of key"""
+        index = int(now // self.window)
+        entry = self._counts.get(key)
+        if entry is None or entry[0] < index - 1:
+            return 0, 0
+        if entry[0] == index - 1:
+            return 0, entry[1]
+        return entry[1], entry[2]
+
+    def check(self, key, now):
+        """Seconds to wait if key is over the limit, else None"""
+        current, previous = self.counts(key, now)
+        if self.estimate(current, previous, now) >= self.limit:
+            return self.retry_after(current, previous, now)
+        return None
+
+    def hit(self, key, now):
+        """Count a hit on key and return None, or return the seconds to wait, without counting it"""
+        index = int(now // self.window)
+        with self._lock:
+            # Checked and counted under one lock, so a burst cannot all pass the check before any is counted
+            retry_after = self.check(key, now)
+            if retry_after is not None:
+                return retry_after
+            current, previous = self.counts(key, now)
+            self._counts[key] = [index, current + 1, previous]
+            # Least recently hit first, so the oldest key is dropped in O(1) when over max_keys
+            self._counts.move_to_end(key)
+            if len(self._counts) > self.max_keys:
+                self._counts.popitem(last=False)
+            if now >= self._next_sweep:
+                self._sweep(index, now)
+        return None
+
+    def undo(self, key, now):
+        """Take back a hit counted at `now`, when another rule refused the request"""
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is not None and entry[0] == int(now // self.window) and entry[1]:
+                entry[1] -= 1
+
+    def _sweep(self, index, now):
+        # Keys idle for two windows are all at the front
+        while self._counts:
+            key, entry = next(iter(self._counts.items()))
+            if entry[0] >= index - 1:
+                break
+            del self._counts[key]
+        self._next_sweep = now + self.window
+
+class SharedWindow:
+    """The same sliding count over the `ratelimit` cache; incr is not atomic on every backend, so counts are approximate"""
+    def __init__(self, local):
+        self.local = local
+        self.cache = caches['ratelimit']
+        # Makes each process's check and count one step; other processes can still interleave
+        self._lock = threading.Lock()
+
+    def keys(self, name, key, now):
+        index = int(now // self.local.window)
+        prefix = f'{name}:{self.local.limit}/{self.local.window}:{key}'
+        return f'{prefix}:{index}', f'{prefix}:{index - 1}'
+
+    def hit(self, name, key, now):
+        """SlidingWindow.hit() against the shared counts"""
+        current_key, previous_key = self.keys(name, key, now)
+        with self._lock:
+            counts = self.cache.get_many([current_key, previous_key])
+            current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+            if self.local.estimate(current, previous, now) >= self.local.limit:
+                return self.local.retry_after(current, previous, now)
+            self.cache.add(current_key, 0, timeout=math.ceil(self.local.window * 2))
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                # Expired between add and incr
+                self.cache.set(current_key, 1, timeout=math.ceil(self.local.window * 2))
+        return None
+
+    def undo(self, name, key, now):
+        current_key, _ = self.keys(name, key, now)
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+
+class RateLimiter:
+    def __init__(self, rules, max_keys, shared):
+        # scope -> [(key kind, local window, shared window or None)]
+        self.rules = {}
+        for scope, scope_rules in rules.items():
+            self.rules[scope] = []
+            for kind, limit, seconds in scope_rules:
+                window = SlidingWindow(limit, seconds, max_keys)
+                self.rules[scope].append((kind, window, SharedWindow(window) if shared else None))
+        self.shared = shared
+
+    def hit(self, scope, ip, email=None):
+        """
+        Count a request against scope's limits and return None, or return the
+        seconds to wait, without counting it, when it is over any of them
+        """
+        rules = self.rules.get(scope, ())
+        keys = {'ip': ip, 'email': email.strip().lower() if email else None}
+        now = time.time()
+        # The in-process counts first: a request they refuse never reaches the shared store
+        hits = [(window, (keys[kind],)) for kind, window, _ in rules if keys[kind] is not None]
+        hits += [
+            (shared, (f'{scope}:{kind}', keys[kind]))
+            for kind, _, shared in rules if shared is not None and keys[kind] is not None
+        ]
+        for position, (window, key) in enumerate(hits):
+            retry_after = window.hit(*key, now)
+            if retry_after is not None:
+                # Refused requests are not counted against the rules that admitted them
+                for counted, counted_key in hits[:position]:
+                    counted.undo(*counted_key, now)
+                return retry_after
+        return None
+
+    async def ahit(self, scope, ip, email=None):
+        if self.shared:
+            return await sync_to_async(self.hit)(scope, ip, email)
+        return self.hit(scope, ip, email)
+
+def client_ip(request):
+    """REMOTE_ADDR, or the address the trusted proxy appended to AUTH_RATE_LIMITS['IP_HEADER']"""
+    header = settings.AUTH_RATE_LIMITS['IP_HEADER']
+    if header and request.META.get(header):
+        return request.META[header].rsplit(',', 1)[-1].strip()
+    return request.META.get('REMOTE_ADDR')
+
+def request_email(data):
+    email = data.get('email') if hasattr(data, 'get') else None
+    return email if isinstance(email, str) else None
+
+def rate_limiter_from_settings():
+    options = settings.AUTH_RATE_LIMITS
+    rules = options['RULES'] if options['ENABLED'] else {}
+    return RateLimiter(rules, options['MAX_KEYS'], options['SHARED'])
+
+rate_limiter = rate_limiter_from_settings()
@@ -1,8 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
 from django.conf import settings
-from .models import User, UserPermission, PasswordResetOTP
+from django.db import transaction
+from core.mail import send_after_commit
+from .models import User, PasswordResetOTP
+from .permissions import encode_permission_map
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,11 +69,6 @@ class CreateUserSerializer(serializers.ModelSerializer):
         user._generated_password = password
         return user
 
-class UserPermissionSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = UserPermission
-        fields = ['id', 'user', 'page', 'permission', 'created_at']
-
 class PasswordResetRequestSerializer(serializers.Serializer):
     email = serializers.EmailField()
     
@@ -85,23 +83,18 @@ class PasswordResetRequestSerializer(serializers.Serializer):
         email = self.validated_data['email']
         user = User.objects.get(email=email)
         
-        # Invalidate previous OTPs
-        PasswordResetOTP.objects.filter(user=user, is_used=False).update(is_used=True)
-        
-        # Generate new OTP
-        otp = PasswordResetOTP.generate_otp()
-        PasswordResetOTP.objects.create(user=user, otp=otp)
-        
-        # Send OTP via email
-        subject = 'Password Reset OTP'
-        message = f'Your OTP for password reset is: {otp}\n\nThis OTP is valid for 10 minutes.'
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [email],
-            fail_silently=False,
-        )
+        with transaction.atomic():
+            # Invalidate previous OTPs
+            PasswordResetOTP.objects.filter(user=user, is_used=False).update(is_used=True)
+            
+            # Generate new OTP
+            otp = PasswordResetOTP.generate_otp()
+            PasswordResetOTP.objects.create(user=user, otp=otp)
+            
+            # Send OTP via email, in the background once the OTP is committed
+            subject = 'Password Reset OTP'
+            message = f'Your OTP for password reset is: {otp}\n\nThis OTP is valid for 10 minutes.'
+            send_after_commit(EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [email]))
         
         return {'message': 'OTP sent to your email'}
 
@@ -156,4 +149,49 @@ class PasswordResetVerifySerializer(serializers.Serializer):
 class UpdateProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['first_name', 'last_name']
\ No newline at end of file
+        fields = ['first_name', 'last_name']
+
+class UserPermissionsEntrySerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+    permissions = serializers.DictField()
+
+class BatchPermissionUpdateSerializer(serializers.Serializer):
+    """
+    Either `users`, a list of {user_id, permissions} entries, or `user_ids`
+    with a single `permissions` map applied to every one of them
+    """
+    users = UserPermissionsEntrySerializer(many=True, required=False)
+    user_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    permissions = serializers.DictField(required=False)
+    
+    def validate(self, attrs):
+        if 'users' in attrs and 'user_ids' not in attrs:
+            entries = [(entry['user_id'], entry['permissions']) for entry in attrs['users']]
+        elif 'user_ids' in attrs and 'permissions' in attrs and 'users' not in attrs:
+            entries = [(user_id, attrs['permissions']) for user_id in attrs['user_ids']]
+        else:
+            raise serializers.ValidationError('Provide either users, or user_ids with permissions.')
+        
+        if not entries:
+            raise serializers.ValidationError('No users given.')
+        
+        # Validate every entry before anything is written
+        existing = set(User.objects.filter(id__in=[user_id for user_id, _ in entries]).values_list('id', flat=True))
+        masks = {}
+        errors = {}
+        for user_id, permissions_data in entries:
+            if user_id not in existing:
+                errors[str(user_id)] = 'User not found'
+            elif user_id in masks:
+                errors[str(user_id)] = 'User listed more than once'
+            else:
+                try:
+                    masks[user_id] = encode_permission_map(permissions_data)
+                except (ValueError, AttributeError, TypeError) as e:
+                    errors[str(user_id)] = str(e)
+        
+        if errors:
+            raise serializers.ValidationError({'users': errors})
+        
+        attrs['masks'] = masks
+        return attrs
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .cache import permission_cache
+from .models import User, UserPermission
+
+@receiver(post_save, sender=UserPermission)
+@receiver(post_delete, sender=UserPermission)
+def invalidate_user_permissions(sender, instance, **kwargs):
+    """Any write to a user's permissions invalidates their cached permission set"""
+    User.bump_permissions_version(instance.user_id)
+    permission_cache.invalidate(instance.user_id)
@@ -0,0 +1,113 @@
+import hashlib
+import time
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .cache import TTLCache
+from .permissions import PERMISSION_BITS, PagePermissionSet
+
+# sha256(token) -> Supabase user id, each entry kept until the token's `exp`
+token_cache = TTLCache(max_size=settings.SUPABASE_CACHE['MAX_SIZE'])
+
+# Supabase user id -> PagePermissionSet (super-admin flag plus page permissions)
+authorization_cache = TTLCache(
+    max_size=settings.SUPABASE_CACHE['MAX_SIZE'],
+    ttl=settings.SUPABASE_CACHE['AUTHORIZATION_TTL'],
+)
+
+_jwks_client = None
+
+def _signing_key(token):
+    """Key to verify a token with: the shared JWT secret, else the project's JWKS"""
+    global _jwks_client
+    if settings.SUPABASE_JWT_SECRET:
+        return settings.SUPABASE_JWT_SECRET, ['HS256']
+    if settings.SUPABASE_JWKS_URL:
+        if _jwks_client is None:
+            # PyJWKClient caches the fetched key set between calls
+            _jwks_client = jwt.PyJWKClient(settings.SUPABASE_JWKS_URL, cache_keys=True)
+        return _jwks_client.get_signing_key_from_jwt(token).key, ['RS256', 'ES256']
+    return None, None
+
+def verify_token_locally(token):
+    """Claims of a valid Supabase access token, or None if no key is configured"""
+    key, algorithms = _signing_key(token)
+    if key is None:
+        return None
+    return jwt.decode(token, key, algorithms=algorithms, audience=settings.SUPABASE_JWT_AUDIENCE)
+
+def _verify_locally(token, token_key):
+    """
+    (verified, user_id) from local verification, memoized under token_key;
+    verified is False when Supabase Auth must decide: no signing key is
+    configured, or the JWKS could not be fetched
+    """
+    try:
+        claims = verify_token_locally(token)
+    except jwt.PyJWKClientConnectionError:
+        return False, None
+    except jwt.PyJWTError:
+        return True, None
+
+    if claims is None:
+        return False, None
+
+    ttl = claims.get('exp', 0) - time.time()
+    if ttl > 0:
+        token_cache.set(token_key, claims['sub'], ttl=ttl)
+    return True, claims['sub']
+
+async def aget_supabase_user_id(supabase, token, verify_remote=False):
+    """
+    Supabase user id of an access token, or None if the token is invalid.
+
+    Tokens are verified locally and memoized until they expire. Pass
+    verify_remote=True for revocation-sensitive operations, which always ask
+    Supabase Auth whether the session is still alive.
+    """
+    if not verify_remote:
+        token_key = hashlib.sha256(token.encode()).hexdigest()
+        user_id = token_cache.get(token_key)
+        if user_id is not None:
+            return user_id
+        if settings.SUPABASE_JWT_SECRET or not settings.SUPABASE_JWKS_URL:
+            verified, user_id = _verify_locally(token, token_key)
+        else:
+            # PyJWKClient fetches the key set with blocking urllib; keep it off the event loop
+            verified, user_id = await sync_to_async(_verify_locally, thread_sensitive=False)(token, token_key)
+        if verified:
+            return user_id
+
+    try:
+        return (await supabase.auth.get_user(token)).user.id
+    except Exception:
+        return None
+
+def _authorization_query(supabase, user_id):
+    return supabase.from_('users')\
+        .select('is_super_admin,user_permissions(page,permission)')\
+        .eq('id', user_id)
+
+def _cache_authorization(user_id, rows):
+    row = rows[0] if rows else {}
+    mask = 0
+    for grant in row.get('user_permissions') or []:
+        mask |= PERMISSION_BITS.get((grant['page'], grant['permission']), 0)
+    snapshot = PagePermissionSet(mask, is_super_admin=bool(row.get('is_super_admin')))
+    authorization_cache.set(user_id, snapshot)
+    return snapshot
+
+async def aget_authorization(supabase, user_id):
+    """
+    Authorization snapshot of a Supabase user, loaded with one embedded
+    users -> user_permissions query and cached for AUTHORIZATION_TTL seconds
+    """
+    snapshot = authorization_cache.get(user_id)
+    if snapshot is None:
+        response = await _authorization_query(supabase, user_id).execute()
+        snapshot = _cache_authorization(user_id, response.data)
+    return snapshot
+
+def invalidate_authorization(user_id=None):
+    """Drop the cached snapshot of one user, or of everyone, after their permissions change"""
+    authorization_cache.invalidate(user_id)
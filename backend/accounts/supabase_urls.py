@@ -0,0 +1,8 @@
+from django.urls import path
+from . import async_comment_views
+
+urlpatterns = [
+    path('comments/<str:comment_id>/', async_comment_views.comment_detail, name='supabase_comment_detail'),
+    path('comments/<str:comment_id>/history/', async_comment_views.comment_history, name='supabase_comment_history'),
+    path('<str:page>/comments/', async_comment_views.page_comments, name='supabase_comment_list_create'),
+]
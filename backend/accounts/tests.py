@@ -0,0 +1,333 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+import supabase_client
+from benchmarks.supabase_standin import SupabaseStandIn
+from .async_comment_views import author_cache
+from .blacklist import BlacklistFilter
+from .cache import permission_cache
+from .hashing import HashingPool
+from .models import User, UserPermission
+from .permissions import PERMISSIONS_CLAIM, encode_permissions, set_permission_masks
+from .ratelimit import RateLimiter, SlidingWindow
+from . import async_auth_views, supabase_auth, tokens
+from .supabase_auth import authorization_cache, token_cache
+
+PAGE = 'products-list'
+
+class SupabaseStandInTestCase(TestCase):
+    """Runs the Supabase comment views against benchmarks.supabase_standin, counting round trips"""
+
+    def setUp(self):
+        self.standin = SupabaseStandIn()
+        supabase_client.use_transport(self.standin)
+        settings = override_settings(SUPABASE_JWT_SECRET=self.standin.jwt_secret, SUPABASE_JWKS_URL='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for cache in (token_cache, authorization_cache, author_cache):
+            cache.invalidate()
+
+    def tearDown(self):
+        supabase_client.use_transport(None)
+
+    def headers(self, user_id):
+        return {'Authorization': f'Bearer {self.standin.token_for(user_id)}'}
+
+class SupabaseCommentListTests(SupabaseStandInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authors = [self.standin.add_user(f'author{index}@example.com', f'Author {index}') for index in range(4)]
+        for index in range(24):
+            self.standin.add_comment(PAGE, self.authors[index % len(self.authors)], f'Comment {index}')
+        self.reader = self.standin.add_user('reader@example.com', 'Reader')
+        self.standin.reset_stats()
+
+    async def get_comments(self):
+        response = await self.async_client.get(f'/api/supabase/{PAGE}/comments/', headers=self.headers(self.reader))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    async def test_authors_resolved_in_one_round_trip(self):
+        comments = await self.get_comments()
+        self.assertEqual(len(comments), 24)
+        self.assertEqual(
+            {comment['author']['email'] for comment in comments},
+            {f'author{index}@example.com' for index in range(4)},
+        )
+        self.assertEqual(self.standin.requests['GET /rest/v1/users'], 1)
+
+        # Cached authors need no lookup at all
+        self.standin.reset_stats()
+        await self.get_comments()
+        self.assertEqual(self.standin.requests['GET /rest/v1/users'], 0)
+
+    @override_settings(SUPABASE_JWT_SECRET='', SUPABASE_JWKS_URL='http://127.0.0.1:9/auth/v1/.well-known/jwks.json')
+    @mock.patch.object(supabase_auth, '_jwks_client', None)
+    async def test_unreachable_jwks_falls_back_to_supabase_auth(self):
+        await self.get_comments()
+        self.assertEqual(self.standin.requests['GET /auth/v1/user'], 1)
+
+class SupabaseCommentWriteTests(SupabaseStandInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.standin.add_user('author@example.com', 'Author')
+        self.editor = self.standin.add_user('editor@example.com', 'Editor', permissions={PAGE: ['edit']})
+        self.stranger = self.standin.add_user('stranger@example.com', 'Stranger')
+        self.comment = self.standin.add_comment(PAGE, self.author, 'Original')
+
+    async def edit(self, user_id, content):
+        return await self.async_client.put(
+            f'/api/supabase/comments/{self.comment["id"]}/', {'content': content},
+            content_type='application/json', headers=self.headers(user_id),
+        )
+
+    async def test_cached_authorization_leaves_two_round_trips(self):
+        self.assertEqual((await self.edit(self.editor, 'First')).status_code, 200)
+        self.standin.reset_stats()
+        response = await self.edit(self.editor, 'Second')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['content'], 'Second')
+        self.assertEqual(sum(self.standin.requests.values()), 2)
+        self.assertEqual(
+            [entry['previous_content'] for entry in self.standin.tables['comment_history']], ['Original', 'First']
+        )
+
+    async def test_author_and_permission_checked_by_the_function(self):
+        response = await self.edit(self.stranger, 'Defaced')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.comment['content'], 'Original')
+        self.assertEqual(self.standin.tables['comment_history'], [])
+        self.assertEqual((await self.edit(self.author, 'By the author')).status_code, 200)
+
+    async def test_delete_keeps_history(self):
+        response = await self.async_client.delete(
+            f'/api/supabase/comments/{self.comment["id"]}/', headers=self.headers(self.author)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.standin.tables['comments'], [])
+        [entry] = self.standin.tables['comment_history']
+        self.assertEqual((entry['action'], entry['comment_id']), ('delete', None))
+
+class SetPermissionMasksTests(TestCase):
+    def test_row_inserted_concurrently_is_overwritten(self):
+        user = User.objects.create_user(username='user', email='user@example.com', password='x')
+        UserPermission.objects.create(user=user, mask=encode_permissions([(PAGE, 'view')]))
+        mask = encode_permissions([(PAGE, 'edit')])
+        # As if another request inserted the row between this one's read and its insert
+        with mock.patch.object(UserPermission.objects, 'select_for_update', return_value=UserPermission.objects.none()):
+            set_permission_masks({user.pk: mask})
+        self.assertEqual(UserPermission.objects.get(user=user).mask, mask)
+
+class RateLimiterTests(SimpleTestCase):
+    def test_concurrent_burst_admits_only_the_limit(self):
+        window = SlidingWindow(limit=10, window=60, max_keys=100)
+        now = time.time()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(window.hit('key', now))) for _ in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(None), 10)
+
+    def test_least_recently_hit_key_dropped_past_max_keys(self):
+        window = SlidingWindow(limit=10, window=60, max_keys=3)
+        now = time.time()
+        for key in 'abcda':
+            window.hit(key, now)
+        self.assertEqual(list(window._counts), ['c', 'd', 'a'])
+
+    def test_refused_request_not_counted_by_other_rules(self):
+        limiter = RateLimiter({'login': [('ip', 100, 60), ('email', 2, 60)]}, max_keys=100, shared=False)
+        results = [limiter.hit('login', '192.0.2.1', 'user@example.com') for _ in range(4)]
+        self.assertEqual(results[:2], [None, None])
+        self.assertTrue(all(results[2:]))
+        ip_window = limiter.rules['login'][0][1]
+        self.assertEqual(sum(ip_window.counts('192.0.2.1', time.time())), 2)
+
+class LoginHashingPoolTests(TransactionTestCase):
+    """Logins run on the pool's own threads and connections, so the user must be committed"""
+
+    def setUp(self):
+        User.objects.create_user(username='user', email='user@example.com', password='secret')
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def use_pool(self, workers, queue_depth, queue_timeout):
+        pool = HashingPool(workers, queue_depth, queue_timeout)
+        patcher = mock.patch.object(async_auth_views, 'hashing_pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return pool
+
+    async def login(self):
+        return await self.async_client.post(
+            '/api/auth/login/', {'email': 'user@example.com', 'password': 'secret'}, content_type='application/json'
+        )
+
+    async def test_login_when_pool_free(self):
+        self.use_pool(workers=1, queue_depth=1, queue_timeout=5)
+        response = await self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['email'], 'user@example.com')
+
+    async def test_refused_when_workers_and_queue_full(self):
+        pool = self.use_pool(workers=1, queue_depth=1, queue_timeout=5)
+        for _ in range(2):
+            pool.submit(self.release.wait)
+        response = await self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(pool.stats, {'accepted': 2, 'rejected': 1, 'expired': 0})
+
+    async def test_dropped_after_queue_timeout(self):
+        pool = self.use_pool(workers=1, queue_depth=1, queue_timeout=0.05)
+        pool.submit(self.release.wait)
+        # The worker frees up only after the queued login has waited past the timeout
+        threading.Timer(0.2, self.release.set).start()
+        response = await self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(pool.stats['expired'], 1)
+
+class BlacklistFilterTests(TestCase):
+    def setUp(self):
+        # Synced on every check, as if the other processes' writes were due
+        self.filter = BlacklistFilter(capacity=1000, error_rate=0.001, sync_interval=0, rebuild_interval=3600)
+        self.filter.rebuild()
+        patcher = mock.patch.object(tokens, 'blacklist_filter', self.filter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='user', email='user@example.com', password='x')
+
+    def blacklist(self, count):
+        """Blacklist `count` new tokens behind the filter's back, as another process would"""
+        outstanding = OutstandingToken.objects.bulk_create(
+            OutstandingToken(jti=uuid.uuid4().hex, token='', expires_at=timezone.now() + timedelta(days=1))
+            for _ in range(count)
+        )
+        return BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in outstanding)
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/refresh/', {'refresh': str(token)})
+
+    def test_blacklisted_token_rejected(self):
+        token = tokens.FilteredRefreshToken.for_user(self.user)
+        token.blacklist()
+        self.assertEqual(self.refresh(token).status_code, 400)
+
+    def test_token_blacklisted_by_another_process_rejected(self):
+        token = tokens.FilteredRefreshToken.for_user(self.user)
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        self.assertEqual(self.refresh(token).status_code, 400)
+
+    def test_rotated_token_not_reusable(self):
+        token = tokens.FilteredRefreshToken.for_user(self.user)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 400)
+        self.assertEqual(self.refresh(response.json()['refresh']).status_code, 200)
+
+    def test_row_committed_behind_newer_rows_picked_up(self):
+        [late] = self.blacklist(1)
+        late_id, late_token = late.id, late.token
+        # Its transaction has not committed by the next sync, which sees 150 newer rows
+        late.delete()
+        self.blacklist(150)
+        self.assertFalse(self.filter.might_be_blacklisted(late_token.jti))
+
+        BlacklistedToken.objects.create(id=late_id, token=late_token)
+        self.assertTrue(self.filter.might_be_blacklisted(late_token.jti))
+
+class PurgeExpiredTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.state = os.path.join(directory.name, 'purge.json')
+        self.now = timezone.now()
+
+    def add_tokens(self, *ages):
+        """One outstanding, blacklisted token per age, expired `age` hours ago (negative: still valid)"""
+        outstanding = OutstandingToken.objects.bulk_create(
+            OutstandingToken(jti=uuid.uuid4().hex, token='', expires_at=self.now - timedelta(hours=age))
+            for age in ages
+        )
+        BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in outstanding)
+        return [token.pk for token in outstanding]
+
+    def purge(self, **options):
+        out = StringIO()
+        call_command('purge_expired', only='tokens', sleep=0, state=self.state, stdout=out, **options)
+        return out.getvalue()
+
+    def remaining(self):
+        return list(OutstandingToken.objects.order_by('pk').values_list('pk', flat=True))
+
+    def test_chunks_delete_only_expired_rows(self):
+        pks = self.add_tokens(*[1, -1] * 12)
+        self.purge(chunk_size=5)
+        self.assertEqual(self.remaining(), pks[1::2])
+        self.assertEqual(BlacklistedToken.objects.count(), 12)
+        self.assertFalse(os.path.exists(self.state))
+
+    def test_dry_run_deletes_nothing(self):
+        pks = self.add_tokens(1, 1, -1)
+        output = self.purge(dry_run=True)
+        self.assertIn('tokens: 2 rows older than', output)
+        self.assertEqual(self.remaining(), pks)
+        self.assertFalse(os.path.exists(self.state))
+
+    def test_resume_continues_after_checkpoint_with_its_cutoff(self):
+        pks = self.add_tokens(3, 3, 3, 1, -1)
+        # Interrupted after the first two rows, with a cutoff of two hours ago
+        with open(self.state, 'w') as state:
+            json.dump({'tokens': {'cutoff': (self.now - timedelta(hours=2)).isoformat(), 'last_pk': pks[1]}}, state)
+        output = self.purge(chunk_size=1)
+        self.assertIn(f'tokens: resuming after id {pks[1]}', output)
+        # Rows up to last_pk are left to a later run; the one expired an hour ago is after the saved cutoff
+        self.assertEqual(self.remaining(), [pks[0], pks[1], pks[3], pks[4]])
+        self.assertFalse(os.path.exists(self.state))
+
+@override_settings(PERMISSION_CLAIMS=True)
+class PermissionClaimsTests(TransactionTestCase):
+    """Logs in through the hashing pool's threads, so the user must be committed"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', email='user@example.com', password='secret')
+        set_permission_masks({self.user.pk: encode_permissions([(PAGE, 'view')])})
+
+    def get_comments(self, access):
+        return self.client.get(f'/api/pages/{PAGE}/comments/', headers={'Authorization': f'Bearer {access}'})
+
+    def test_claims_replace_permission_queries_until_permissions_change(self):
+        response = self.client.post('/api/auth/login/', {'email': 'user@example.com', 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        tokens = response.json()
+
+        # Nothing to fall back on: the permission cache is cold
+        permission_cache.invalidate()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_comments(tokens['access']).status_code, 200)
+        self.assertFalse([query for query in queries if UserPermission._meta.db_table in query['sql']])
+
+        mask = encode_permissions([(PAGE, 'view'), (PAGE, 'edit')])
+        set_permission_masks({self.user.pk: mask})
+        self.assertEqual(self.get_comments(tokens['access']).status_code, 401)
+
+        response = self.client.post('/api/auth/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        access = response.json()['access']
+        self.assertEqual(AccessToken(access)[PERMISSIONS_CLAIM], mask)
+        self.assertEqual(self.get_comments(access).status_code, 200)
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .blacklist import blacklist_filter
+from .permissions import PERMISSIONS_CLAIM, SUPER_ADMIN_CLAIM, VERSION_CLAIM, load_permission_set
+
+User = get_user_model()
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken that asks the database about the blacklist only when accounts.blacklist's filter cannot rule it out"""
+    def check_blacklist(self):
+        if blacklist_filter.might_be_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
+
+def access_token_for(refresh, user=None):
+    """
+    Access token for a refresh token, carrying the user's page permissions
+    when PERMISSION_CLAIMS is enabled
+    """
+    access = refresh.access_token
+    if settings.PERMISSION_CLAIMS:
+        if user is None:
+            user = User.objects.get(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]})
+        access[PERMISSIONS_CLAIM] = load_permission_set(user).mask
+        access[SUPER_ADMIN_CLAIM] = user.is_super_admin
+        access[VERSION_CLAIM] = user.permissions_version
+    return access
+
+class PermissionClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that rejects access tokens whose permission claims no
+    longer match the user, so clients refresh them after a permission change
+    """
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if VERSION_CLAIM in validated_token and (
+            validated_token[VERSION_CLAIM] != user.permissions_version
+            or validated_token[SUPER_ADMIN_CLAIM] != user.is_super_admin
+        ):
+            raise InvalidToken('Permissions have changed, refresh the access token')
+        return user
@@ -1,40 +1,54 @@
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import get_user_model
+from .cache import permission_cache
 from .models import UserPermission, PasswordResetOTP
+from .permissions import encode_permission_map, permission_entries, permission_map, set_permission_masks
+from .ratelimit import client_ip, rate_limiter, request_email
+from .tokens import FilteredRefreshToken, access_token_for
 from .serializers import (
     UserSerializer, LoginSerializer, CreateUserSerializer, 
-    UserPermissionSerializer, PasswordResetRequestSerializer,
-    PasswordResetVerifySerializer, UpdateProfileSerializer
+    PasswordResetRequestSerializer,
+    PasswordResetVerifySerializer, UpdateProfileSerializer,
+    BatchPermissionUpdateSerializer
 )
 
 User = get_user_model()
 
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
-def login_view(request):
-    serializer = LoginSerializer(data=request.data)
+def login_result(data):
+    """
+    (body, status) of a login attempt. Verifies the password hash, so it runs
+    on accounts.hashing's pool; see async_auth_views.login_view
+    """
+    serializer = LoginSerializer(data=data)
     if serializer.is_valid():
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
-        return Response({
+        refresh = FilteredRefreshToken.for_user(user)
+        return {
             'refresh': str(refresh),
-            'access': str(refresh.access_token),
+            'access': str(access_token_for(refresh, user)),
             'user': UserSerializer(user).data
-        })
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        }, status.HTTP_200_OK
+    return serializer.errors, status.HTTP_400_BAD_REQUEST
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def refresh_token_view(request):
     try:
         refresh_token = request.data['refresh']
-        token = RefreshToken(refresh_token)
-        return Response({
-            'access': str(token.access_token),
-        })
+        token = FilteredRefreshToken(refresh_token)
+        data = {'access': str(access_token_for(token))}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # The presented token is single-use from here on
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                token.blacklist()
+            token.set_jti()
+            token.set_exp()
+            token.set_iat()
+            data['refresh'] = str(token)
+        return Response(data)
     except Exception as e:
         return Response({'error': 'Invalid refresh token'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -91,32 +105,45 @@ def update_user_permissions(request, user_id):
         user = User.objects.get(id=user_id)
         permissions_data = request.data.get('permissions', {})
         
-        # Clear existing permissions for user
-        UserPermission.objects.filter(user=user).delete()
+        mask = encode_permission_map(permissions_data)
         
-        # Create new permissions
-        for page, permission_list in permissions_data.items():
-            if isinstance(permission_list, list):
-                for permission in permission_list:
-                    UserPermission.objects.create(
-                        user=user,
-                        page=page,
-                        permission=permission.lower()
-                    )
-            else:
-                # Single permission
-                UserPermission.objects.create(
-                    user=user,
-                    page=page,
-                    permission=permission_list.lower()
-                )
+        # Diff against the stored mask and write only if something changed
+        current = set_permission_masks({user.id: mask})[user.id]
         
-        return Response({'message': 'Permissions updated successfully'})
+        return Response({
+            'message': 'Permissions updated successfully',
+            'added': permission_map(mask & ~current),
+            'removed': permission_map(current & ~mask),
+        })
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsSuperAdmin])
+def batch_update_permissions(request):
+    """Update the permissions of many users at once, all or nothing"""
+    serializer = BatchPermissionUpdateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    masks = serializer.validated_data['masks']
+    previous = set_permission_masks(masks)
+    
+    results = [
+        {
+            'user_id': user_id,
+            'added': permission_map(mask & ~previous[user_id]),
+            'removed': permission_map(previous[user_id] & ~mask),
+        }
+        for user_id, mask in masks.items()
+    ]
+    return Response({
+        'message': f'Permissions updated for {len(results)} users',
+        'results': results,
+    })
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_permissions_view(request, user_id=None):
@@ -130,8 +157,7 @@ def user_permissions_view(request, user_id=None):
             # Get permissions for current user
             permissions = UserPermission.objects.filter(user=request.user)
             
-        serializer = UserPermissionSerializer(permissions, many=True)
-        return Response(serializer.data)
+        return Response(permission_entries(permissions))
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -139,13 +165,28 @@ def user_permissions_view(request, user_id=None):
 @permission_classes([permissions.IsAuthenticated, IsSuperAdmin])
 def all_permissions_view(request):
     """Get all user permissions for admin dashboard"""
-    permissions = UserPermission.objects.select_related('user').all()
-    serializer = UserPermissionSerializer(permissions, many=True)
-    return Response(serializer.data)
+    permissions = UserPermission.objects.exclude(mask=0)
+    return Response(permission_entries(permissions))
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsSuperAdmin])
+def permission_cache_stats_view(request):
+    """Hit/miss counters of this process's permission cache"""
+    return Response(permission_cache.stats())
+
+def rate_limited_response(retry_after):
+    return Response(
+        {'error': 'Too many requests, try again later'},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(retry_after)},
+    )
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def password_reset_request(request):
+    retry_after = rate_limiter.hit('password_reset_request', client_ip(request), request_email(request.data))
+    if retry_after is not None:
+        return rate_limited_response(retry_after)
     serializer = PasswordResetRequestSerializer(data=request.data)
     if serializer.is_valid():
         result = serializer.save()
@@ -155,6 +196,9 @@ def password_reset_request(request):
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def password_reset_verify(request):
+    retry_after = rate_limiter.hit('password_reset_verify', client_ip(request), request_email(request.data))
+    if retry_after is not None:
+        return rate_limited_response(retry_after)
     serializer = PasswordResetVerifySerializer(data=request.data)
     if serializer.is_valid():
         result = serializer.save()
@@ -166,7 +210,7 @@ def password_reset_verify(request):
 def logout_view(request):
     try:
         refresh_token = request.data["refresh"]
-        token = RefreshToken(refresh_token)
+        token = FilteredRefreshToken(refresh_token)
         token.blacklist()
         return Response({'message': 'Successfully logged out'})
     except Exception as e:
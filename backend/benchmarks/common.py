@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def setup_django(database_path=None):
+    """
+    Configure Django against a scratch SQLite database (a new temporary file
+    unless a path is given) and return that path
+    """
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+    if database_path is None:
+        fd, database_path = tempfile.mkstemp(prefix='bench-', suffix='.sqlite3')
+        os.close(fd)
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database_path
+
+    import django
+    django.setup()
+    return database_path
+
+def percentile(timings, fraction):
+    """Nearest-rank percentile of a list of timings, fraction in [0, 1]"""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -0,0 +1,297 @@
+"""
+End-to-end HTTP load test of the API. Seeds a scratch SQLite database,
+serves core.wsgi on a local threaded HTTP server and drives the real
+routes from a pool of client threads at a fixed concurrency, one scenario
+at a time. Reports throughput, p50/p95/p99 latency and SQL queries per
+request (counted server-side), and writes them as JSON for diffing
+between commits.
+
+    python -m benchmarks.http_load --users 200 --comments 5000 --concurrency 8 --json load.json
+
+Client and server share one process, so absolute numbers are lower than a
+real deployment; compare runs made on the same machine.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from .common import BACKEND_DIR, percentile, setup_django
+
+PAGES = [
+    'products-list', 'marketing-list', 'order-list', 'media-plans', 'offer-pricing',
+    'clients', 'suppliers', 'customer-support', 'sales-reports', 'finance',
+]
+PAGE = 'clients'
+PASSWORD = 'benchmark-password'
+SCENARIOS = [
+    'login', 'refresh', 'available', 'comments_list', 'comment_create',
+    'comment_update', 'comment_delete', 'comment_history', 'permissions',
+]
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+class QueryCounter:
+    """WSGI wrapper reporting the SQL queries of each request in an X-Query-Count header"""
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        from django.db import connection
+
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        def start_counted_response(status, headers, exc_info=None):
+            return start_response(status, headers + [('X-Query-Count', str(queries))], exc_info)
+
+        # Django calls start_response once the view has run, so the count is final
+        with connection.execute_wrapper(count):
+            return self.application(environ, start_counted_response)
+
+def seed(args, rng):
+    """Bulk-insert users, permission masks, comments and history; returns what the scenarios use"""
+    from django.contrib.auth.hashers import make_password
+    from accounts.models import User, UserPermission
+    from accounts.permissions import encode_permissions
+    from accounts.tokens import FilteredRefreshToken, access_token_for
+    from pages.models import Comment, CommentHistory
+
+    # One real hash shared by every user: logins pay the configured hasher's cost
+    password = make_password(PASSWORD)
+    admin = User.objects.create(username='admin', email='admin@example.com', password=password, is_super_admin=True)
+    users = User.objects.bulk_create(
+        User(username=f'user{i}', email=f'user{i}@example.com', password=password)
+        for i in range(args.users)
+    )
+    editors = users[:max(1, len(users) // 10)]
+
+    masks = []
+    for user in users:
+        grants = {(page, 'view') for page in rng.sample(PAGES, 3)} | {(PAGE, 'view')}
+        if user in editors:
+            grants |= {(PAGE, permission) for permission in ('create', 'edit', 'delete')}
+        masks.append(UserPermission(user=user, mask=encode_permissions(grants)))
+    UserPermission.objects.bulk_create(masks, batch_size=1000)
+
+    comments = Comment.objects.bulk_create(
+        (
+            Comment(page=PAGE if index % 2 else rng.choice(PAGES), content=f'Comment {index}', author=rng.choice(users))
+            for index in range(args.comments)
+        ),
+        batch_size=1000,
+    )
+    # Separate rows for the delete scenario, so it never runs out
+    doomed = Comment.objects.bulk_create(
+        (Comment(page=PAGE, content='To delete', author=rng.choice(users)) for _ in range(args.requests)),
+        batch_size=1000,
+    )
+    targets = [comment for comment in comments if comment.page == PAGE][:50]
+    CommentHistory.objects.bulk_create(
+        (
+            CommentHistory(comment=comment, previous_content='Earlier text', modified_by=rng.choice(editors), action='updated')
+            for comment in targets
+            for _ in range(5)
+        ),
+        batch_size=1000,
+    )
+
+    def tokens(user):
+        refresh = FilteredRefreshToken.for_user(user)
+        return str(access_token_for(refresh, user)), str(refresh)
+
+    user_tokens = [tokens(user) for user in users[:50]]
+    # Refresh tokens are rotated and blacklisted on use, so every refresh request needs its own
+    refresh_tokens = [str(FilteredRefreshToken.for_user(users[index % len(users)])) for index in range(args.requests)]
+    return {
+        'emails': [user.email for user in users],
+        'user_tokens': user_tokens,
+        'refresh_tokens': refresh_tokens,
+        'editor_tokens': [tokens(user)[0] for user in editors[:20]],
+        'admin_token': tokens(admin)[0],
+        'targets': [comment.id for comment in targets],
+        'doomed': [comment.id for comment in doomed],
+    }
+
+def build_requests(keys):
+    """scenario -> function(index) returning (method, path, body, access token)"""
+    def pick(items, index):
+        return items[index % len(items)]
+
+    return {
+        'login': lambda i: ('POST', '/api/auth/login/', {'email': pick(keys['emails'], i), 'password': PASSWORD}, None),
+        'refresh': lambda i: ('POST', '/api/auth/refresh/', {'refresh': keys['refresh_tokens'][i]}, None),
+        'available': lambda i: ('GET', '/api/pages/available/', None, pick(keys['user_tokens'], i)[0]),
+        'comments_list': lambda i: ('GET', f'/api/pages/{PAGE}/comments/', None, pick(keys['user_tokens'], i)[0]),
+        'comment_create': lambda i: (
+            'POST', f'/api/pages/{PAGE}/comments/', {'page': PAGE, 'content': f'Load test {i}'}, pick(keys['editor_tokens'], i)
+        ),
+        'comment_update': lambda i: (
+            'PUT', f'/api/pages/comments/{pick(keys["targets"], i)}/', {'page': PAGE, 'content': f'Edit {i}'},
+            pick(keys['editor_tokens'], i),
+        ),
+        'comment_delete': lambda i: (
+            'DELETE', f'/api/pages/comments/{keys["doomed"][i]}/', None, pick(keys['editor_tokens'], i)
+        ),
+        'comment_history': lambda i: (
+            'GET', f'/api/pages/comments/{pick(keys["targets"], i)}/history/', None, keys['admin_token']
+        ),
+        'permissions': lambda i: ('GET', '/api/auth/permissions/', None, keys['admin_token']),
+    }
+
+def send(port, method, path, body, token):
+    """(status, seconds, query count) of one HTTP request"""
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    started = time.perf_counter()
+    try:
+        connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = connection.getresponse()
+        response.read()
+        elapsed = time.perf_counter() - started
+        return response.status, elapsed, int(response.getheader('X-Query-Count', 0))
+    finally:
+        connection.close()
+
+def run_scenario(port, make_request, total, concurrency):
+    counter = itertools.count()
+    lock = threading.Lock()
+    results = []
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter)
+            if index >= total:
+                return
+            result = send(port, *make_request(index))
+            with lock:
+                results.append(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    duration = time.perf_counter() - started
+
+    timings = [elapsed for _, elapsed, _ in results]
+    queries = [count for _, _, count in results]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(results),
+        'errors': sum(1 for status, _, _ in results if status >= 400),
+        'statuses': statuses,
+        'seconds': round(duration, 3),
+        'throughput_rps': round(len(results) / duration, 2),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'max_queries': max(queries),
+    }
+
+def environment():
+    import django
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'django': django.get_version()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--login-requests', type=int, default=40,
+                        help='requests for the login scenario, which is bound by the password hasher')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset of ' + ', '.join(SCENARIOS))
+    parser.add_argument('--permission-claims', action='store_true', help='run with PERMISSION_CLAIMS enabled')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    database_path = setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connection
+    from accounts.ratelimit import rate_limiter
+
+    settings.DEBUG = False
+    settings.PERMISSION_CLAIMS = args.permission_claims
+    # Writers wait for SQLite's lock instead of failing under concurrency
+    settings.DATABASES['default']['OPTIONS'] = {'timeout': 30}
+    # Every client shares one IP; measure the endpoints, not the auth rate limits
+    rate_limiter.rules.clear()
+
+    server = None
+    try:
+        call_command('migrate', verbosity=0)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        keys = seed(args, random.Random(args.seed))
+        connection.close()
+
+        server = make_server('127.0.0.1', 0, QueryCounter(get_wsgi_application()),
+                             server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        requests = build_requests(keys)
+        results = {}
+        for name in scenarios:
+            total = args.login_requests if name == 'login' else args.requests
+            results[name] = run_scenario(port, requests[name], total, args.concurrency)
+            result = results[name]
+            print(
+                f'{name:<16} {result["throughput_rps"]:>8} req/s  p50 {result["p50_ms"]:>8} ms  '
+                f'p95 {result["p95_ms"]:>8} ms  p99 {result["p99_ms"]:>8} ms  '
+                f'{result["queries_per_request"]:>5} queries  {result["errors"]} errors'
+            )
+    finally:
+        if server is not None:
+            server.shutdown()
+        connection.close()
+        for path in (database_path, f'{database_path}-wal', f'{database_path}-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'args': vars(args), 'environment': environment(), 'results': results}, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Login storm: many clients logging in at once while others use the API.
+Reports login throughput and status codes (429/503 are admission control
+refusing work) and the latency of the other clients' requests, first with
+no storm, then for each hashing pool configuration:
+
+- unbounded: as many hashing threads and queue slots as storm clients,
+  i.e. every login hashes as soon as it arrives
+- bounded: the --workers / --queue-depth pool
+
+    python -m benchmarks.login_storm --storm-clients 32 --probe-clients 4 --duration 10 --json storm.json
+
+Uses the configured password hasher, so logins cost what they cost in
+production.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from .common import percentile, setup_django
+from .http_load import PAGE, PASSWORD, QueryCounter, QuietHandler, ThreadingWSGIServer, environment, seed, send
+
+def drive(port, clients, duration, make_request):
+    """Run `clients` threads sending requests back to back for `duration` seconds; [(status, seconds)]"""
+    results = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(number):
+        index = number
+        while time.perf_counter() < deadline:
+            status, elapsed, _ = send(port, *make_request(index))
+            with lock:
+                results.append((status, elapsed))
+            index += clients
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def summarize(results, duration):
+    timings = [elapsed for _, elapsed in results]
+    ok = [elapsed for status, elapsed in results if status == 200]
+    summary = {
+        'requests': len(results),
+        'statuses': dict(sorted(Counter(str(status) for status, _ in results).items())),
+        'ok_per_second': round(len(ok) / duration, 2),
+    }
+    if ok:
+        summary.update({
+            'ok_p50_ms': round(percentile(ok, 0.50) * 1000, 2),
+            'ok_p95_ms': round(percentile(ok, 0.95) * 1000, 2),
+            'ok_p99_ms': round(percentile(ok, 0.99) * 1000, 2),
+        })
+    if timings:
+        summary['mean_ms'] = round(statistics.mean(timings) * 1000, 2)
+    return summary
+
+def run(port, args, keys, storm):
+    def login(index):
+        return 'POST', '/api/auth/login/', {'email': keys['emails'][index % len(keys['emails'])], 'password': PASSWORD}, None
+
+    def probe(index):
+        token = keys['user_tokens'][index % len(keys['user_tokens'])][0]
+        path = '/api/pages/available/' if index % 2 else f'/api/pages/{PAGE}/comments/'
+        return 'GET', path, None, token
+
+    results = {}
+    storm_thread = None
+    if storm:
+        storm_results = []
+        storm_thread = threading.Thread(
+            target=lambda: storm_results.extend(drive(port, args.storm_clients, args.duration, login))
+        )
+        storm_thread.start()
+        # Let the storm build up before measuring the other clients
+        time.sleep(min(1.0, args.duration / 5))
+    results['probe'] = summarize(drive(port, args.probe_clients, args.duration, probe), args.duration)
+    if storm_thread is not None:
+        storm_thread.join()
+        results['login'] = summarize(storm_results, args.duration)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--storm-clients', type=int, default=32, help='concurrent clients logging in')
+    parser.add_argument('--probe-clients', type=int, default=4, help='concurrent clients using other endpoints')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per configuration')
+    parser.add_argument('--workers', type=int, default=None, help='hashing threads (default LOGIN_HASHING_WORKERS)')
+    parser.add_argument('--queue-depth', type=int, default=None, help='default LOGIN_HASHING_QUEUE_DEPTH')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    database_path = setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connection
+    from wsgiref.simple_server import make_server
+    from accounts import async_auth_views
+    from accounts.hashing import HashingPool
+    from accounts.ratelimit import rate_limiter
+
+    settings.DEBUG = False
+    settings.DATABASES['default']['OPTIONS'] = {'timeout': 30}
+    # Every client shares one IP; measure the endpoints, not the auth rate limits
+    rate_limiter.rules.clear()
+    options = settings.LOGIN_HASHING
+    workers = args.workers or options['WORKERS']
+    queue_depth = options['QUEUE_DEPTH'] if args.queue_depth is None else args.queue_depth
+    configurations = {
+        'unbounded': HashingPool(args.storm_clients, args.storm_clients, float('inf')),
+        'bounded': HashingPool(workers, queue_depth, options['QUEUE_TIMEOUT']),
+    }
+
+    server = None
+    results = {}
+    try:
+        call_command('migrate', verbosity=0)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        keys = seed(SimpleNamespace(users=args.users, comments=1000, requests=0), random.Random(args.seed))
+        connection.close()
+
+        server = make_server('127.0.0.1', 0, QueryCounter(get_wsgi_application()),
+                             server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        results['no storm'] = run(port, args, keys, storm=False)
+        for name, pool in configurations.items():
+            async_auth_views.hashing_pool = pool
+            results[name] = run(port, args, keys, storm=True)
+            results[name]['pool'] = {'workers': pool.workers, 'queue_depth': pool.queue_depth, **pool.stats}
+    finally:
+        if server is not None:
+            server.shutdown()
+        connection.close()
+        for path in (database_path, f'{database_path}-wal', f'{database_path}-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    for name, result in results.items():
+        probe = result['probe']
+        line = f'{name:<10} other endpoints p50 {probe.get("ok_p50_ms", "-"):>8} ms  p95 {probe.get("ok_p95_ms", "-"):>8} ms  ' \
+               f'{probe["ok_per_second"]:>8} req/s'
+        if 'login' in result:
+            login = result['login']
+            line += f'  | logins {login["ok_per_second"]:>6}/s  p95 {login.get("ok_p95_ms", "-"):>8} ms  {login["statuses"]}'
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'args': vars(args), 'environment': environment(), 'results': results}, output, indent=2)
+
+if __name__ == '__main__':
+    main()
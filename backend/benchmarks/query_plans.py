@@ -0,0 +1,156 @@
+"""
+Query plans and timings of the hot lookups before and after the composite
+indexes (accounts 0004, pages 0002), on a scratch SQLite database. The
+permission mask lookup is included as a baseline: it is served by the
+unique index of UserPermission.user.
+
+    python -m benchmarks.query_plans --users 10000 --comments 200000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from .common import setup_django
+
+PAGES = [
+    'products-list', 'marketing-list', 'order-list', 'media-plans', 'offer-pricing',
+    'clients', 'suppliers', 'customer-support', 'sales-reports', 'finance',
+]
+
+def seed(connection, transaction, args, rng):
+    """Insert rows with executemany; returns the keys the probes look up"""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO accounts_user (password, is_superuser, username, first_name, last_name, email, '
+            'is_staff, is_active, date_joined, is_super_admin, permissions_version, created_at, updated_at) '
+            "VALUES ('!', 0, %s, '', '', %s, 0, 1, %s, 0, 0, %s, %s)",
+            [(f'user{i}', f'user{i}@example.com', start, start, start) for i in range(args.users)],
+        )
+        cursor.execute('SELECT MIN(id) FROM accounts_user')
+        first_user = cursor.fetchone()[0]
+        user_ids = range(first_user, first_user + args.users)
+
+        cursor.executemany(
+            'INSERT INTO accounts_userpermission (user_id, mask, created_at, updated_at) VALUES (%s, %s, %s, %s)',
+            [(user_id, rng.getrandbits(40), start, start) for user_id in user_ids],
+        )
+        cursor.executemany(
+            'INSERT INTO accounts_passwordresetotp (user_id, otp, created_at, is_used) VALUES (%s, %s, %s, %s)',
+            [
+                (user_id, f'{rng.randrange(10 ** 6):06d}', start, index < args.otps_per_user - 1)
+                for user_id in user_ids
+                for index in range(args.otps_per_user)
+            ],
+        )
+
+        comments = []
+        for index in range(args.comments):
+            created_at = start + timedelta(seconds=index * 7)
+            comments.append((rng.choice(PAGES), f'Comment {index}', rng.choice(user_ids), created_at, created_at))
+        cursor.executemany(
+            'INSERT INTO pages_comment (page, content, author_id, created_at, updated_at) VALUES (%s, %s, %s, %s, %s)',
+            comments,
+        )
+        cursor.execute('SELECT MIN(id) FROM pages_comment')
+        first_comment = cursor.fetchone()[0]
+        comment_ids = range(first_comment, first_comment + args.comments)
+
+        cursor.executemany(
+            'INSERT INTO pages_commenthistory (comment_id, previous_content, modified_by_id, modified_at, action) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [
+                (comment_id, 'Earlier text', rng.choice(user_ids), start + timedelta(seconds=comment_id * 7 + step), 'updated')
+                for comment_id in comment_ids
+                for step in range(args.history_per_comment)
+            ],
+        )
+
+    probe_user = rng.choice(user_ids)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT otp FROM accounts_passwordresetotp WHERE user_id = %s AND is_used = 0', [probe_user])
+        probe_otp = cursor.fetchone()[0]
+    return {
+        'page': 'clients',
+        'comment': rng.choice(comment_ids),
+        'user': probe_user,
+        'otp': probe_otp,
+        'keyset_before': start + timedelta(seconds=args.comments * 7 // 2),
+    }
+
+def build_probes(keys):
+    """The querysets the API issues on its hot paths"""
+    from accounts.models import PasswordResetOTP, UserPermission
+    from pages.models import Comment, CommentHistory
+
+    comments = Comment.objects.filter(page=keys['page'])
+    return {
+        'comment list, first page': lambda: comments.order_by('-created_at', '-id')[:21],
+        'comment list, deep keyset page': lambda: comments.filter(
+            created_at__lt=keys['keyset_before']
+        ).order_by('-created_at', '-id')[:21],
+        'comment history': lambda: CommentHistory.objects.filter(comment_id=keys['comment']).order_by('-modified_at'),
+        'permission mask': lambda: UserPermission.objects.filter(user_id=keys['user']).values_list('mask', flat=True),
+        'password reset OTP': lambda: PasswordResetOTP.objects.filter(user_id=keys['user'], otp=keys['otp'], is_used=False),
+    }
+
+def measure(probes, repeat):
+    results = {}
+    for name, probe in probes.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(probe())
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'plan': probe().explain(),
+            'median_ms': round(statistics.median(timings), 3),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--history-per-comment', type=int, default=2)
+    parser.add_argument('--otps-per-user', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=50, help='timed executions per query')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    database_path = setup_django()
+    from django.core.management import call_command
+    from django.db import connection, transaction
+
+    try:
+        # Schema as it was before the composite indexes
+        call_command('migrate', 'accounts', '0003', verbosity=0)
+        call_command('migrate', 'pages', '0001', verbosity=0)
+        keys = seed(connection, transaction, args, random.Random(args.seed))
+        probes = build_probes(keys)
+        before = measure(probes, args.repeat)
+
+        call_command('migrate', verbosity=0)
+        after = measure(probes, args.repeat)
+    finally:
+        connection.close()
+        os.remove(database_path)
+
+    for name in probes:
+        print(f'== {name}')
+        for label, results in (('before', before), ('after', after)):
+            print(f'   {label}: {results[name]["median_ms"]} ms')
+            for line in results[name]['plan'].splitlines():
+                print(f'      {line}')
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'args': vars(args), 'before': before, 'after': after}, output, indent=2)
+
+if __name__ == '__main__':
+    main()
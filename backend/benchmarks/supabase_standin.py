@@ -0,0 +1,241 @@
+"""
+In-process stand-in for the parts of Supabase the comment views use: the
+PostgREST table API (select with one level of embedding, eq/in filters,
+order, insert, update, delete), the comment RPC functions and Auth's
+/user endpoint.
+
+It is an httpx transport, so the real supabase clients run unchanged on top
+of it, every request can be delayed by an injected latency, and each round
+trip is counted per endpoint:
+
+    standin = SupabaseStandIn(latency=0.02)
+    supabase_client.use_transport(standin)
+    token = standin.token_for(user_id)
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+
+import httpx
+import jwt
+
+JWT_SECRET = 'supabase-stand-in-jwt-secret-for-benchmarks'
+
+# Embeddable child tables: (parent, child) -> foreign key column on the child
+RELATIONS = {
+    ('users', 'user_permissions'): 'user_id',
+}
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+def split_columns(select):
+    """'a,b,child(c,d)' -> ['a', 'b', 'child(c,d)']"""
+    columns, depth, current = [], 0, ''
+    for char in select:
+        if char == ',' and depth == 0:
+            columns.append(current)
+            current = ''
+            continue
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        current += char
+    if current:
+        columns.append(current)
+    return columns
+
+def parse_filter(value):
+    operator, _, operand = value.partition('.')
+    if operator == 'eq':
+        return lambda field: str(field) == operand
+    if operator == 'in':
+        options = set(operand.strip('()').split(','))
+        return lambda field: str(field) in options
+    raise ValueError(f'Unsupported filter: {value}')
+
+class SupabaseStandIn(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Thread-safe in-memory Supabase. `latency` seconds (plus up to `jitter`)
+    are slept before each response: time.sleep() for sync clients,
+    asyncio.sleep() for async ones.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, seed=None, jwt_secret=JWT_SECRET):
+        self.latency = latency
+        self.jitter = jitter
+        self.jwt_secret = jwt_secret
+        self.tables = {'users': [], 'user_permissions': [], 'comments': [], 'comment_history': []}
+        self.requests = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # Data
+
+    def add_user(self, email, full_name='', is_super_admin=False, permissions=None):
+        """Insert a user with {page: [permissions]} grants and return their id"""
+        user_id = str(uuid.uuid4())
+        self.tables['users'].append({
+            'id': user_id, 'email': email, 'password': '!', 'full_name': full_name,
+            'is_super_admin': is_super_admin, 'created_at': now(), 'updated_at': now(),
+        })
+        for page, page_permissions in (permissions or {}).items():
+            for permission in page_permissions:
+                self.tables['user_permissions'].append({
+                    'id': str(uuid.uuid4()), 'user_id': user_id, 'page': page,
+                    'permission': permission, 'created_at': now(),
+                })
+        return user_id
+
+    def add_comment(self, page, author_id, content):
+        return self._insert('comments', {'page': page, 'author_id': author_id, 'content': content})
+
+    def token_for(self, user_id, expires_in=3600):
+        """A Supabase-style access token, valid for local verification with jwt_secret"""
+        claims = {'sub': user_id, 'aud': 'authenticated', 'role': 'authenticated', 'exp': int(time.time()) + expires_in}
+        return jwt.encode(claims, self.jwt_secret, algorithm='HS256')
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+
+    # Transport
+
+    def handle_request(self, request):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._respond(request)
+
+    async def handle_async_request(self, request):
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(request)
+
+    def _delay(self):
+        with self._lock:
+            return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def _respond(self, request):
+        path = request.url.path
+        with self._lock:
+            self.requests[f'{request.method} {path}'] += 1
+            try:
+                if path == '/auth/v1/user':
+                    return self._get_user(request)
+                if path.startswith('/rest/v1/rpc/'):
+                    return self._rpc(path.rsplit('/', 1)[1], json.loads(request.content or b'{}'))
+                if path.startswith('/rest/v1/'):
+                    return self._table(request, path[len('/rest/v1/'):])
+            except (KeyError, ValueError) as e:
+                return httpx.Response(400, json={'message': str(e), 'code': 'PGRST100'})
+        return httpx.Response(404, json={'message': f'No route for {path}'})
+
+    # Auth
+
+    def _get_user(self, request):
+        token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        try:
+            claims = jwt.decode(token, self.jwt_secret, algorithms=['HS256'], audience='authenticated')
+        except jwt.PyJWTError:
+            return httpx.Response(401, json={'code': 401, 'msg': 'invalid JWT'})
+        user = next((row for row in self.tables['users'] if row['id'] == claims['sub']), None)
+        if user is None:
+            return httpx.Response(404, json={'code': 404, 'msg': 'User not found'})
+        return httpx.Response(200, json={
+            'id': user['id'], 'aud': 'authenticated', 'role': 'authenticated', 'email': user['email'],
+            'app_metadata': {}, 'user_metadata': {}, 'created_at': user['created_at'],
+        })
+
+    # PostgREST
+
+    def _table(self, request, table):
+        rows = self.tables[table]
+        params = parse_qsl(request.url.query.decode())
+        matchers = [(column, parse_filter(value)) for column, value in params if column not in ('select', 'order')]
+        matching = [row for row in rows if all(match(row.get(column)) for column, match in matchers)]
+
+        if request.method == 'GET':
+            options = dict(params)
+            if 'order' in options:
+                column, _, direction = options['order'].partition('.')
+                matching.sort(key=lambda row: row.get(column) or '', reverse=direction.startswith('desc'))
+            return httpx.Response(200, json=[self._project(table, row, options.get('select', '*')) for row in matching])
+
+        if request.method == 'POST':
+            payload = json.loads(request.content)
+            payload = payload if isinstance(payload, list) else [payload]
+            return httpx.Response(201, json=[self._insert(table, values) for values in payload])
+
+        if request.method == 'PATCH':
+            values = json.loads(request.content)
+            for row in matching:
+                row.update({column: now() if value == 'now()' else value for column, value in values.items()})
+            return httpx.Response(200, json=[dict(row) for row in matching])
+
+        if request.method == 'DELETE':
+            deleted = {id(row) for row in matching}
+            self.tables[table] = [row for row in rows if id(row) not in deleted]
+            return httpx.Response(200, json=matching)
+        return httpx.Response(405, json={'message': f'Unsupported method {request.method}'})
+
+    def _insert(self, table, values):
+        row = {'id': str(uuid.uuid4()), 'created_at': now(), **values}
+        if table == 'comments':
+            row.setdefault('updated_at', row['created_at'])
+        self.tables[table].append(row)
+        return dict(row)
+
+    def _project(self, table, row, select):
+        if select == '*':
+            return dict(row)
+        projected = {}
+        for column in split_columns(select):
+            if '(' in column:
+                child, _, child_select = column[:-1].partition('(')
+                foreign_key = RELATIONS[(table, child)]
+                projected[child] = [
+                    self._project(child, child_row, child_select)
+                    for child_row in self.tables[child]
+                    if child_row[foreign_key] == row['id']
+                ]
+            else:
+                projected[column] = row.get(column)
+        return projected
+
+    # RPC, mirroring supabase/migrations/*_comment_mutations_with_history.sql
+
+    def _rpc(self, function, params):
+        if function not in ('update_comment_with_history', 'delete_comment_with_history'):
+            return httpx.Response(404, json={'message': f'Unknown function {function}', 'code': 'PGRST202'})
+
+        comment = next((row for row in self.tables['comments'] if row['id'] == params['p_comment_id']), None)
+        if comment is None:
+            return httpx.Response(200, json=[])
+        allowed = comment['author_id'] == params['p_modified_by'] or params.get('p_any_page') \
+            or comment['page'] in params.get('p_pages', [])
+        if not allowed:
+            return httpx.Response(403, json={
+                'code': '42501', 'message': 'Permission denied', 'details': None, 'hint': None,
+            })
+
+        editing = function == 'update_comment_with_history'
+        self._insert('comment_history', {
+            'comment_id': comment['id'],
+            'previous_content': comment['content'],
+            'modified_by': params['p_modified_by'],
+            'action': 'edit' if editing else 'delete',
+        })
+        if editing:
+            comment.update(content=params['p_content'], updated_at=now())
+        else:
+            self.tables['comments'].remove(comment)
+            # comment_history.comment_id is set to null on delete; the history is kept
+            for entry in self.tables['comment_history']:
+                if entry['comment_id'] == comment['id']:
+                    entry['comment_id'] = None
+        return httpx.Response(200, json=[dict(comment)])
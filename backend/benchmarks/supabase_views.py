@@ -0,0 +1,147 @@
+"""
+Supabase round trips and latency of every comment view
+(accounts.async_comment_views, through the ASGI handler), against the
+in-process stand-in with injected latency. No network or Supabase project
+is needed.
+
+"cold" clears the token, authorization and author caches before every
+request; "warm" measures with them filled.
+
+    python -m benchmarks.supabase_views --latency 0.02 --iterations 20 --json supabase.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import Counter
+
+from .common import percentile, setup_django
+from .supabase_standin import SupabaseStandIn
+
+PAGE = 'clients'
+VIEWS = ['get_comments', 'add_comment', 'update_comment', 'delete_comment', 'get_comment_history']
+
+def seed(standin, args):
+    editor = standin.add_user('editor@example.com', 'Editor', permissions={PAGE: ['view', 'create', 'edit', 'delete']})
+    admin = standin.add_user('admin@example.com', 'Admin', is_super_admin=True)
+    authors = [standin.add_user(f'author{i}@example.com', f'Author {i}') for i in range(args.authors)]
+    for index in range(args.comments):
+        standin.add_comment(PAGE, authors[index % len(authors)], f'Comment {index}')
+    target = standin.add_comment(PAGE, authors[0], 'Edited by the benchmark')
+    return {
+        'editor': standin.token_for(editor),
+        'admin': standin.token_for(admin),
+        'author': authors[0],
+        'target': target['id'],
+    }
+
+def plan(view, standin, keys):
+    """(token, method, args, body) of one request to a view"""
+    if view == 'get_comments':
+        return keys['editor'], 'get', [PAGE], None
+    if view == 'add_comment':
+        return keys['editor'], 'post', [PAGE], {'content': 'New comment'}
+    if view == 'update_comment':
+        return keys['editor'], 'put', [keys['target']], {'content': f'Edit {time.perf_counter()}'}
+    if view == 'delete_comment':
+        # A fresh comment every time, created without a round trip
+        return keys['editor'], 'delete', [standin.add_comment(PAGE, keys['author'], 'To delete')['id']], None
+    return keys['admin'], 'get', [keys['target']], None
+
+def clear_caches():
+    from accounts.async_comment_views import author_cache
+    from accounts.supabase_auth import authorization_cache, token_cache
+
+    for cache in (token_cache, authorization_cache, author_cache):
+        cache.invalidate()
+
+def view_url(view, args):
+    if view in ('get_comments', 'add_comment'):
+        return f'/api/supabase/{args[0]}/comments/'
+    if view == 'get_comment_history':
+        return f'/api/supabase/comments/{args[0]}/history/'
+    return f'/api/supabase/comments/{args[0]}/'
+
+async def send(client, view, token, method, args, body):
+    kwargs = {'headers': {'Authorization': f'Bearer {token}'}}
+    if body is not None:
+        kwargs.update(data=body, content_type='application/json')
+    response = await getattr(client, method)(view_url(view, args), **kwargs)
+    return response.status_code
+
+def summarize(standin, timings, iterations, statuses):
+    return {
+        'round_trips': sum(standin.requests.values()) / iterations,
+        'endpoints': {endpoint: count / iterations for endpoint, count in sorted(standin.requests.items())},
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'mean_ms': round(statistics.mean(timings) * 1000, 2),
+        'statuses': dict(statuses),
+    }
+
+async def measure(standin, keys, view, cold, iterations):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    timings, statuses = [], Counter()
+    standin.reset_stats()
+    for _ in range(iterations):
+        request = plan(view, standin, keys)
+        if cold:
+            clear_caches()
+        started = time.perf_counter()
+        statuses[await send(client, view, *request)] += 1
+        timings.append(time.perf_counter() - started)
+    return summarize(standin, timings, iterations, statuses)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every Supabase request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra seconds per request')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--comments', type=int, default=50, help='comments on the listed page')
+    parser.add_argument('--authors', type=int, default=10)
+    parser.add_argument('--remote-auth', action='store_true',
+                        help='verify tokens with Supabase Auth instead of locally with the JWT secret')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    database_path = setup_django()
+    from django.conf import settings
+    from django.test.utils import setup_test_environment
+    import supabase_client
+
+    setup_test_environment()
+    standin = SupabaseStandIn(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    settings.SUPABASE_JWT_SECRET = '' if args.remote_auth else standin.jwt_secret
+    settings.SUPABASE_JWKS_URL = ''
+    supabase_client.use_transport(standin)
+    keys = seed(standin, args)
+
+    results = {}
+    try:
+        for view in VIEWS:
+            for cold in (True, False):
+                label = 'cold' if cold else 'warm'
+                results[f'{view} {label}'] = asyncio.run(
+                    measure(standin, keys, view, cold, args.iterations)
+                )
+    finally:
+        supabase_client.use_transport(None)
+        os.remove(database_path)
+
+    print(f'{"view":<36} {"trips":>6} {"p50 ms":>8} {"p95 ms":>8}')
+    for name, result in results.items():
+        print(f'{name:<36} {result["round_trips"]:>6.2f} {result["p50_ms"]:>8} {result["p95_ms"]:>8}')
+        for endpoint, count in result['endpoints'].items():
+            print(f'      {count:>5.2f}  {endpoint}')
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'args': vars(args), 'results': results}, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Refresh-token blacklist checks with many historical tokens. Seeds
+--tokens outstanding refresh tokens, all blacklisted as rotation leaves
+them, then measures, with and without accounts.blacklist's Bloom filter:
+
+- verify: decoding a live refresh token, blacklist check included
+- refresh: the whole /api/auth/refresh/ view, which also rotates the token
+  and blacklists the old one
+
+    python -m benchmarks.token_blacklist --tokens 2000000 --iterations 2000 --json blacklist.json
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from .common import percentile, setup_django
+
+def seed(count, chunk_size):
+    """A user and `count` blacklisted outstanding tokens; returns the user"""
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+    from accounts.models import User
+
+    user = User.objects.create_user(username='benchmark', email='benchmark@example.com', password='benchmark')
+    now = timezone.now()
+    expires_at = now + timedelta(days=7)
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        outstanding = OutstandingToken.objects.bulk_create(
+            OutstandingToken(user=user, jti=uuid.uuid4().hex, token='', created_at=now, expires_at=expires_at)
+            for _ in range(size)
+        )
+        BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in outstanding)
+        print(f'  {start + size} / {count} tokens', end='\r', flush=True)
+    print()
+    return user
+
+def measure(operation, iterations):
+    from django.db import connection
+
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    timings = []
+    for _ in range(iterations):
+        step = operation()
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            step()
+            timings.append(time.perf_counter() - started)
+    return {
+        'per_second': round(len(timings) / sum(timings), 1),
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'queries': round(queries / iterations, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=1000000, help='historical, blacklisted refresh tokens')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    database_path = setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from accounts import views
+    from accounts.blacklist import blacklist_filter
+    from accounts.tokens import FilteredRefreshToken
+
+    settings.DEBUG = False
+    results = {}
+    try:
+        call_command('migrate', verbosity=0)
+        started = time.perf_counter()
+        user = seed(args.tokens, args.chunk_size)
+        print(f'seeded in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        blacklist_filter.rebuild()
+        results['filter'] = {
+            'build_seconds': round(time.perf_counter() - started, 2),
+            'bytes': len(blacklist_filter._filter.bits),
+            'hashes': blacklist_filter._filter.hashes,
+        }
+        factory = APIRequestFactory()
+
+        for name, token_class in (('unfiltered', RefreshToken), ('filtered', FilteredRefreshToken)):
+            def verify():
+                token = str(token_class.for_user(user))
+                return lambda: token_class(token)
+
+            def refresh():
+                request = factory.post('/api/auth/refresh/', {'refresh': str(token_class.for_user(user))}, format='json')
+                return lambda: views.refresh_token_view(request)
+
+            results[f'verify {name}'] = measure(verify, args.iterations)
+            views.FilteredRefreshToken = token_class
+            try:
+                results[f'refresh {name}'] = measure(refresh, args.iterations)
+            finally:
+                views.FilteredRefreshToken = FilteredRefreshToken
+        results['filter'].update(blacklist_filter.stats)
+    finally:
+        connection.close()
+        os.remove(database_path)
+
+    print(f'filter: {results["filter"]}')
+    print(f'{"":<20} {"ops/s":>10} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8}')
+    for name, result in results.items():
+        if name != 'filter':
+            print(f'{name:<20} {result["per_second"]:>10} {result["p50_ms"]:>9} {result["p95_ms"]:>9} {result["queries"]:>8}')
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'args': vars(args), 'results': results}, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,12 @@
+"""
+ASGI entry point. Serve with an ASGI server, e.g.
+
+    uvicorn core.asgi:application --workers 4
+
+so the async Supabase comment views (api/supabase/) run on the worker's event
+loop and share its pooled Supabase client, instead of being run one request
+at a time per thread as under WSGI.
+"""
 import os
 from django.core.asgi import get_asgi_application
 
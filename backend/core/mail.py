@@ -0,0 +1,142 @@
+"""
+Background email delivery. Requests hand messages to `mail_queue` and
+return; one worker thread per process sends them over a single connection
+to EMAIL_BACKEND, kept open between batches and closed after
+EMAIL_QUEUE['IDLE_TIMEOUT'] seconds without mail. A message that fails is
+retried after RETRY_DELAY seconds (doubling) up to MAX_RETRIES times, then
+logged and dropped.
+"""
+import atexit
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+class MailQueue:
+    def __init__(self, batch_size, batch_wait, max_retries, retry_delay, idle_timeout):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue()
+        # (due, sequence, attempts, message) waiting out their retry delay
+        self._retries = []
+        self._sequence = itertools.count()
+        self._connection = None
+        self._last_used = 0.0
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, message):
+        """Queue an EmailMessage for delivery; never blocks on the mail server"""
+        self._start()
+        self._queue.put((0, message))
+
+    def flush(self, timeout=None):
+        """Wait until every queued message, retries included, is sent or dropped; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='mail-queue', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
+            elif self._connection is not None and time.monotonic() - self._last_used >= self.idle_timeout:
+                self._close()
+
+    def _next_batch(self):
+        """Up to batch_size messages: due retries first, then whatever arrives within batch_wait"""
+        now = time.monotonic()
+        batch = []
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            _, _, attempts, message = heapq.heappop(self._retries)
+            batch.append((attempts, message))
+
+        timeout = self.idle_timeout
+        if self._retries:
+            timeout = min(timeout, max(0.0, self._retries[0][0] - now))
+        if batch:
+            timeout = 0.0
+        try:
+            batch.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+        except queue.Empty:
+            return batch
+
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, batch):
+        for attempts, message in batch:
+            try:
+                if self._connection is None:
+                    self._connection = get_connection(fail_silently=False)
+                    self._connection.open()
+                self._connection.send_messages([message])
+            except Exception:
+                # The connection may be half-broken; start the next message on a fresh one
+                self._close()
+                self._failed(attempts, message)
+            else:
+                self._queue.task_done()
+        self._last_used = time.monotonic()
+
+    def _failed(self, attempts, message):
+        if attempts >= self.max_retries:
+            logger.exception('Dropping email to %s after %d attempts', ', '.join(message.to), attempts + 1)
+            self._queue.task_done()
+            return
+        delay = self.retry_delay * 2 ** attempts
+        logger.warning('Email to %s failed, retrying in %.1fs', ', '.join(message.to), delay, exc_info=True)
+        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), attempts + 1, message))
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                logger.warning('Closing the mail connection failed', exc_info=True)
+            self._connection = None
+
+def mail_queue_from_settings():
+    options = settings.EMAIL_QUEUE
+    return MailQueue(
+        options['BATCH_SIZE'], options['BATCH_WAIT_MS'] / 1000, options['MAX_RETRIES'],
+        options['RETRY_DELAY'], options['IDLE_TIMEOUT'],
+    )
+
+mail_queue = mail_queue_from_settings()
+# Give mail queued just before shutdown a chance to go out
+atexit.register(mail_queue.flush, 5)
+
+def send_after_commit(message):
+    """Deliver an EmailMessage once the current transaction commits, in the background if EMAIL_QUEUE is enabled"""
+    if settings.EMAIL_QUEUE['ENABLED']:
+        transaction.on_commit(lambda: mail_queue.enqueue(message))
+    else:
+        transaction.on_commit(message.send)
@@ -0,0 +1,196 @@
+"""
+Per-route request metrics, aggregated in-process and served in the
+Prometheus text format on /metrics.
+
+Each worker process keeps its own counters; scrape every worker (or run one
+worker per scrape target) to see all traffic.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+from .sqlwrappers import execute_wrapper
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+# Any other method is recorded as 'other', so clients cannot create unbounded label values
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'}
+
+class Histogram:
+    """Bucket counts plus sum and count; observe() is O(log buckets)"""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.sql_seconds = 0.0
+        self.statuses = {}
+
+class MetricsRegistry:
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, seconds, queries, sql_seconds, size):
+        with self._lock:
+            metrics = self._routes.get((route, method))
+            if metrics is None:
+                metrics = self._routes[(route, method)] = RouteMetrics()
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(queries)
+            if size is not None:
+                metrics.response_size.observe(size)
+            metrics.sql_seconds += sql_seconds
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def render(self):
+        """Prometheus text exposition format, version 0.0.4"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+            histograms = (
+                ('http_request_duration_seconds', 'Request latency in seconds', 'latency'),
+                ('http_request_queries', 'SQL queries per request', 'queries'),
+                ('http_response_size_bytes', 'Response body size in bytes', 'response_size'),
+            )
+            for name, help_text, attribute in histograms:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (route, method), metrics in routes:
+                    labels = f'route="{escape(route)}",method="{method}"'
+                    histogram = getattr(metrics, attribute)
+                    for bound, total in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+            lines += ['# HELP http_request_sql_seconds_total Time spent in SQL', '# TYPE http_request_sql_seconds_total counter']
+            for (route, method), metrics in routes:
+                lines.append(f'http_request_sql_seconds_total{{route="{escape(route)}",method="{method}"}} {metrics.sql_seconds}')
+
+            lines += ['# HELP http_requests_total Requests by response status', '# TYPE http_requests_total counter']
+            for (route, method), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(
+                        f'http_requests_total{{route="{escape(route)}",method="{method}",status="{status}"}} {count}'
+                    )
+        return '\n'.join(lines + cache_lines()) + '\n'
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def cache_lines():
+    from accounts.cache import permission_cache
+
+    stats = permission_cache.stats()
+    return [
+        '# HELP permission_cache_hits_total Permission cache hits',
+        '# TYPE permission_cache_hits_total counter',
+        f'permission_cache_hits_total {stats["hits"]}',
+        '# HELP permission_cache_misses_total Permission cache misses',
+        '# TYPE permission_cache_misses_total counter',
+        f'permission_cache_misses_total {stats["misses"]}',
+        '# HELP permission_cache_entries Cached permission sets',
+        '# TYPE permission_cache_entries gauge',
+        f'permission_cache_entries {stats["size"]}',
+    ]
+
+registry = MetricsRegistry()
+
+class QueryTimer:
+    """Execute wrapper counting the queries of one request and their time"""
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+class MetricsMiddleware:
+    """
+    Record latency, SQL queries and time, and response size per route.
+
+    Routes are labelled with their URL pattern (e.g. api/pages/<str:page>/comments/),
+    never the raw path, so the number of series stays bounded. Put it first in
+    MIDDLEWARE so the latency covers the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with execute_wrapper(timer):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        # Counts the queries of sync views too, which run on the executor thread's connection
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with execute_wrapper(timer):
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    def record(self, request, response, seconds, timer):
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        method = request.method if request.method in METHODS else 'other'
+        registry.observe(route, method, response.status_code, seconds, timer.queries, timer.seconds, size)
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint; requires `Authorization: Bearer <METRICS_TOKEN>`,
+    and without a token it is only served with DEBUG on
+    """
+    if not settings.METRICS_ENABLED or not (settings.METRICS_TOKEN or settings.DEBUG):
+        raise Http404
+    if settings.METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied, settings.METRICS_TOKEN):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
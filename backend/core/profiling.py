@@ -0,0 +1,252 @@
+"""
+On-demand and sampled request profiling.
+
+A super admin profiles one request to any /api/ route by sending
+`X-Profile: pstats` (cProfile, for pstats/snakeviz) or `X-Profile: collapsed`
+(stack sampling, one `frame;frame;frame count` line per stack, for
+flamegraph tools), or the same values as a `_profile` query parameter. The
+response carries `X-Profile-Id`, and the artifact is fetched from
+/api/profiles/<id>/.
+
+With PROFILING['SAMPLE_RATE'] above zero, that fraction of all /api/
+traffic is profiled with the low-overhead stack sampler as well. Artifacts
+go to a rotating store on disk that keeps the newest MAX_PROFILES.
+"""
+import cProfile
+import json
+import marshal
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import FileResponse
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+
+from accounts.tokens import PermissionClaimsJWTAuthentication
+from accounts.views import IsSuperAdmin
+
+PROJECT_DIR = str(Path(__file__).resolve().parent.parent)
+FORMATS = {'pstats': 'pstats', '1': 'pstats', 'collapsed': 'collapsed'}
+PROFILE_ID = re.compile(r'[0-9a-f]{32}')
+
+def frame_label(code):
+    filename = code.co_filename
+    if 'site-packages/' in filename:
+        filename = filename.rsplit('site-packages/', 1)[1]
+    elif filename.startswith(PROJECT_DIR):
+        filename = filename[len(PROJECT_DIR) + 1:]
+    return f'{filename}:{code.co_qualname}'
+
+class StackSampler:
+    """Samples the given threads' stacks every `interval` seconds into collapsed-stack counts"""
+    def __init__(self, thread_ids, interval):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.thread_ids:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+class ProfileStore:
+    """Profiles as <time>-<id>.<format> plus a <time>-<id>.json description; keeps the newest max_profiles"""
+    def __init__(self, directory, max_profiles):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, artifact, profile_format, description):
+        profile_id = uuid.uuid4().hex
+        stem = f'{time.time_ns()}-{profile_id}'
+        description = {'id': profile_id, 'format': profile_format, 'created': time.time(), **description}
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / f'{stem}.{profile_format}').write_bytes(artifact)
+            (self.directory / f'{stem}.json').write_text(json.dumps(description))
+            descriptions = self._descriptions()
+            for stale in descriptions[:max(0, len(descriptions) - self.max_profiles)]:
+                for path in self.directory.glob(f'{stale.stem}.*'):
+                    path.unlink(missing_ok=True)
+        return profile_id
+
+    def list(self):
+        with self._lock:
+            descriptions = self._descriptions()
+        return [json.loads(path.read_text()) for path in reversed(descriptions)]
+
+    def artifact(self, profile_id):
+        """(path, format) of a stored profile, or None"""
+        if not PROFILE_ID.fullmatch(profile_id):
+            return None
+        for path in self.directory.glob(f'*-{profile_id}.*'):
+            if path.suffix != '.json':
+                return path, path.suffix[1:]
+        return None
+
+    def _descriptions(self):
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob('*.json'))
+
+store = ProfileStore(settings.PROFILING['DIRECTORY'], settings.PROFILING['MAX_PROFILES'])
+
+def requested_format(request):
+    value = request.headers.get('X-Profile') or request.GET.get('_profile')
+    return FORMATS.get(value.lower()) if value else None
+
+def is_super_admin(request):
+    """Authenticate the bearer token the way the API does; middleware runs before DRF"""
+    try:
+        authenticated = PermissionClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_super_admin
+
+class ProfilingMiddleware:
+    """Profiles /api/ requests asked for by a super admin, plus a random SAMPLE_RATE of all of them"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING['SAMPLE_RATE']
+        self.interval = settings.PROFILING['SAMPLE_INTERVAL_MS'] / 1000
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile_format, trigger = self.choose(request)
+        if profile_format is not None and trigger == 'requested' and not is_super_admin(request):
+            profile_format = None
+        if profile_format is None:
+            return self.get_response(request)
+
+        profiler = self.start(profile_format)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            artifact = self.stop(profiler, profile_format)
+        return self.save(request, response, artifact, profile_format, trigger, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        profile_format, trigger = self.choose(request)
+        if profile_format is not None and trigger == 'requested' and not await sync_to_async(is_super_admin)(request):
+            profile_format = None
+        if profile_format is None:
+            return await self.get_response(request)
+
+        # Sync views run in this request's sync_to_async thread, async ones on the event loop
+        # thread, where concurrent requests show up in the profile too; profile both
+        profiler = await self.astart(profile_format)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            artifact = await self.astop(profiler, profile_format)
+        return self.save(request, response, artifact, profile_format, trigger, time.perf_counter() - started)
+
+    def choose(self, request):
+        """(format, trigger) of the profile to take, or (None, None)"""
+        if not request.path.startswith('/api/') or request.path.startswith('/api/profiles/'):
+            return None, None
+        profile_format = requested_format(request)
+        if profile_format is not None:
+            return profile_format, 'requested'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'collapsed', 'sampled'
+        return None, None
+
+    def start(self, profile_format, thread_ids=()):
+        """Profile the calling thread, and with the stack sampler `thread_ids` as well"""
+        if profile_format == 'pstats':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler([threading.get_ident(), *thread_ids], self.interval)
+            profiler.start()
+        return profiler
+
+    async def astart(self, profile_format):
+        """start() for the event loop thread and the thread sync_to_async runs this request's sync code in"""
+        if profile_format == 'pstats':
+            # cProfile only sees the thread that enabled it
+            return self.start(profile_format), await sync_to_async(self.start)(profile_format)
+        return self.start(profile_format, [await sync_to_async(threading.get_ident)()])
+
+    def stop(self, profiler, profile_format):
+        if profile_format == 'pstats':
+            profiler.disable()
+            profiler.create_stats()
+            return marshal.dumps(profiler.stats)
+        profiler.stop()
+        return profiler.collapsed().encode()
+
+    async def astop(self, profiler, profile_format):
+        if profile_format != 'pstats':
+            return self.stop(profiler, profile_format)
+        loop_profiler, sync_profiler = profiler
+        loop_profiler.disable()
+        await sync_to_async(sync_profiler.disable)()
+        return marshal.dumps(pstats.Stats(loop_profiler, sync_profiler).stats)
+
+    def save(self, request, response, artifact, profile_format, trigger, seconds):
+        profile_id = store.save(artifact, profile_format, {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(seconds * 1000, 2),
+            'trigger': trigger,
+        })
+        if trigger == 'requested':
+            response['X-Profile-Id'] = profile_id
+        return response
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsSuperAdmin])
+def profile_list_view(request):
+    """Stored profiles, newest first"""
+    return Response(store.list())
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsSuperAdmin])
+def profile_detail_view(request, profile_id):
+    """Download one profile: .pstats for pstats.Stats / snakeviz, .collapsed for flamegraph tools"""
+    found = store.artifact(profile_id)
+    if found is None:
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    path, profile_format = found
+    return FileResponse(path.open('rb'), as_attachment=True, filename=f'{profile_id}.{profile_format}')
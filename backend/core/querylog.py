@@ -0,0 +1,144 @@
+"""
+Optional slow-query log. Logs, to the `core.querylog` logger:
+
+- every SQL statement slower than SLOW_QUERY_LOG['THRESHOLD_MS'],
+- every request running more than SLOW_QUERY_LOG['MAX_QUERIES'] statements,
+- statements repeated SLOW_QUERY_LOG['REPEAT_THRESHOLD'] times or more from
+  the same call site within one request, as likely N+1 queries.
+
+Entries carry the normalized SQL, its duration and the project code that
+issued it, innermost frame first (e.g. accounts/permissions.py:131 in
+load_permission_set < pages/views.py:30 in HasPagePermission.has_permission).
+"""
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .sqlwrappers import execute_wrapper
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = str(Path(__file__).resolve().parent.parent)
+# Query wrappers and middleware in the call stack, never the code that issued the query
+INFRASTRUCTURE_FILES = {
+    str(Path(__file__).resolve().with_name(name)) for name in ('querylog.py', 'metrics.py', 'sqlwrappers.py')
+}
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+def normalize_sql(sql):
+    """Strip literals and collapse IN lists, so statements differing only in values compare equal"""
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = PLACEHOLDER_LIST.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+def call_site(depth=3):
+    """
+    The innermost project frames that led to a query, innermost first, e.g.
+    'accounts/permissions.py:131 in load_permission_set < pages/views.py:30 in HasPagePermission.has_permission'
+    """
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < depth:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_DIR) and filename not in INFRASTRUCTURE_FILES and 'site-packages' not in filename:
+            relative = filename[len(PROJECT_DIR) + 1:]
+            frames.append(f'{relative}:{frame.f_lineno} in {frame.f_code.co_qualname}')
+        frame = frame.f_back
+    return ' < '.join(frames) or 'unknown'
+
+class QueryLog:
+    """Execute wrapper recording each statement with its duration and call site"""
+    def __init__(self, threshold_ms, max_queries, repeat_threshold):
+        self.threshold = threshold_ms / 1000
+        self.max_queries = max_queries
+        self.repeat_threshold = repeat_threshold
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            statement = (normalize_sql(sql), duration, call_site())
+            self.statements.append(statement)
+            if duration >= self.threshold:
+                logger.warning(
+                    'Slow query %.1f ms at %s: %s', duration * 1000, statement[2], statement[0],
+                    extra={'sql': statement[0], 'duration_ms': duration * 1000, 'call_site': statement[2]},
+                )
+
+    def report(self, label):
+        """Log the request-level findings once its statements have all run"""
+        if not self.statements:
+            return
+        total_ms = sum(duration for _, duration, _ in self.statements) * 1000
+        repeats = Counter((sql, site) for sql, _, site in self.statements)
+
+        if len(self.statements) > self.max_queries:
+            top = '; '.join(f'{count} x {site}' for (_, site), count in repeats.most_common(3))
+            logger.warning(
+                '%s ran %d queries (%.1f ms of SQL); most frequent: %s', label, len(self.statements), total_ms, top,
+                extra={'request': label, 'queries': len(self.statements), 'sql_ms': total_ms},
+            )
+
+        for (sql, site), count in repeats.items():
+            if count >= self.repeat_threshold:
+                logger.warning(
+                    'Likely N+1 in %s: %d x %s at %s', label, count, sql, site,
+                    extra={'request': label, 'sql': sql, 'call_site': site, 'repeats': count},
+                )
+
+def query_log():
+    options = settings.SLOW_QUERY_LOG
+    return QueryLog(options['THRESHOLD_MS'], options['MAX_QUERIES'], options['REPEAT_THRESHOLD'])
+
+@contextmanager
+def log_slow_queries(label):
+    """Slow-query log for code outside a request, e.g. a management command"""
+    log = query_log()
+    with execute_wrapper(log):
+        yield log
+    log.report(label)
+
+class SlowQueryLogMiddleware:
+    """Enabled by SLOW_QUERY_LOG['ENABLED']; removes itself from the stack otherwise"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        log = query_log()
+        with execute_wrapper(log):
+            response = self.get_response(request)
+        log.report(f'{request.method} {request.path}')
+        return response
+
+    async def __acall__(self, request):
+        log = query_log()
+        with execute_wrapper(log):
+            response = await self.get_response(request)
+        log.report(f'{request.method} {request.path}')
+        return response
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
@@ -24,12 +25,16 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'accounts',
     'pages',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.querylog.SlowQueryLogMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -59,6 +64,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 # Database
 DATABASES = {
@@ -102,7 +108,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.tokens.PermissionClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -138,6 +144,10 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Embed page permissions in access tokens so permission checks skip the database.
+# A stale token is rejected with 401 once the user's permissions_version moves on.
+PERMISSION_CLAIMS = config('PERMISSION_CLAIMS', default=False, cast=bool)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -151,10 +161,120 @@ CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only for development
 
 # Email settings (for password reset)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')  # Console for development
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
 EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
-DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@example.com')
\ No newline at end of file
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@example.com')
+
+# Background email delivery (core/mail.py): one worker per process sends queued mail in
+# batches over one persistent connection, retrying failures RETRY_DELAY seconds later (doubling)
+EMAIL_QUEUE = {
+    'ENABLED': config('EMAIL_QUEUE_ENABLED', default=True, cast=bool),
+    'BATCH_SIZE': config('EMAIL_QUEUE_BATCH_SIZE', default=50, cast=int),
+    'BATCH_WAIT_MS': config('EMAIL_QUEUE_BATCH_WAIT_MS', default=100, cast=float),
+    'MAX_RETRIES': config('EMAIL_QUEUE_MAX_RETRIES', default=3, cast=int),
+    'RETRY_DELAY': config('EMAIL_QUEUE_RETRY_DELAY', default=2, cast=float),
+    'IDLE_TIMEOUT': config('EMAIL_QUEUE_IDLE_TIMEOUT', default=30, cast=float),
+}
+
+# Bloom filter of blacklisted refresh tokens (accounts/blacklist.py), per process: tokens it
+# rules out skip the blacklist query. Picks up other processes' blacklisting every
+# SYNC_INTERVAL seconds, so a token can be reused on another worker for at most that long
+# (see "Token Blacklist" in README.md); 0 syncs on every check
+TOKEN_BLACKLIST_FILTER = {
+    'CAPACITY': config('TOKEN_BLACKLIST_FILTER_CAPACITY', default=100000, cast=int),
+    'ERROR_RATE': config('TOKEN_BLACKLIST_FILTER_ERROR_RATE', default=0.001, cast=float),
+    'SYNC_INTERVAL': config('TOKEN_BLACKLIST_FILTER_SYNC_INTERVAL', default=1, cast=float),
+    'REBUILD_INTERVAL': config('TOKEN_BLACKLIST_FILTER_REBUILD_INTERVAL', default=3600, cast=float),
+}
+
+# Sliding-window limits on the unauthenticated auth endpoints (accounts/ratelimit.py):
+# scope -> [(key, requests, seconds)], keyed by client 'ip' or request 'email'. Counts are
+# per process unless RATE_LIMIT_SHARED, which also keeps them in the `ratelimit` cache.
+# Behind a proxy set RATE_LIMIT_IP_HEADER, e.g. HTTP_X_FORWARDED_FOR.
+AUTH_RATE_LIMITS = {
+    'ENABLED': config('RATE_LIMIT_ENABLED', default=True, cast=bool),
+    'SHARED': config('RATE_LIMIT_SHARED', default=False, cast=bool),
+    'IP_HEADER': config('RATE_LIMIT_IP_HEADER', default=''),
+    'MAX_KEYS': config('RATE_LIMIT_MAX_KEYS', default=100000, cast=int),
+    'RULES': {
+        'login': [('ip', 30, 60), ('email', 10, 300)],
+        'password_reset_request': [('ip', 10, 600), ('email', 3, 900)],
+        'password_reset_verify': [('ip', 20, 600), ('email', 5, 900)],
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared rate-limit counters; for the database backend use
+    # django.core.cache.backends.db.DatabaseCache with a table name and run createcachetable
+    'ratelimit': {
+        'BACKEND': config('RATE_LIMIT_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('RATE_LIMIT_CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'access-control-ratelimit')),
+    },
+}
+
+# Login password verification pool (accounts/hashing.py), per process. WORKERS caps the cores
+# logins can use; beyond WORKERS + QUEUE_DEPTH in flight logins get 429, and those queued
+# longer than QUEUE_TIMEOUT seconds get 503
+LOGIN_HASHING = {
+    'WORKERS': config('LOGIN_HASHING_WORKERS', default=max(1, (os.cpu_count() or 2) // 2), cast=int),
+    'QUEUE_DEPTH': config('LOGIN_HASHING_QUEUE_DEPTH', default=16, cast=int),
+    'QUEUE_TIMEOUT': config('LOGIN_HASHING_QUEUE_TIMEOUT', default=5, cast=float),
+}
+
+# Defaults of manage.py purge_expired: OTPs are deleted this many hours after they were
+# issued, comment history this many days after the change (0 keeps history forever)
+RETENTION = {
+    'OTP_HOURS': config('OTP_RETENTION_HOURS', default=24, cast=float),
+    'HISTORY_DAYS': config('HISTORY_RETENTION_DAYS', default=0, cast=int),
+}
+
+# Effective-permission cache (per process)
+PERMISSION_CACHE = {
+    'MAX_SIZE': config('PERMISSION_CACHE_MAX_SIZE', default=10000, cast=int),
+    'TTL': config('PERMISSION_CACHE_TTL', default=300, cast=int),  # seconds
+}
+
+# Local verification of Supabase access tokens: the project's JWT secret (HS256),
+# else its JWKS URL. With neither set, every token is checked with Supabase Auth.
+SUPABASE_JWT_SECRET = config('SUPABASE_JWT_SECRET', default='')
+SUPABASE_JWKS_URL = config('SUPABASE_JWKS_URL', default='')
+SUPABASE_JWT_AUDIENCE = config('SUPABASE_JWT_AUDIENCE', default='authenticated')
+
+# Caches in front of the Supabase-backed comment views (accounts/async_comment_views.py)
+SUPABASE_CACHE = {
+    'MAX_SIZE': config('SUPABASE_CACHE_MAX_SIZE', default=10000, cast=int),
+    'AUTHOR_TTL': config('SUPABASE_AUTHOR_CACHE_TTL', default=60, cast=int),  # seconds
+    'AUTHORIZATION_TTL': config('SUPABASE_AUTHORIZATION_CACHE_TTL', default=30, cast=int),  # seconds
+}
+
+# Per-route latency, SQL and response size metrics, served on /metrics (core/metrics.py).
+# /metrics requires `Authorization: Bearer <METRICS_TOKEN>` from the scraper, and outside DEBUG is not
+# served at all without a token; collection is on by default only when it can be served.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_ENABLED = config('METRICS_ENABLED', default=bool(METRICS_TOKEN) or DEBUG, cast=bool)
+
+# Slow-query log (core/querylog.py), off by default: logs statements over THRESHOLD_MS,
+# requests over MAX_QUERIES statements and likely N+1s to the `core.querylog` logger
+SLOW_QUERY_LOG = {
+    'ENABLED': config('SLOW_QUERY_LOG', default=False, cast=bool),
+    'THRESHOLD_MS': config('SLOW_QUERY_THRESHOLD_MS', default=100, cast=float),
+    'MAX_QUERIES': config('SLOW_QUERY_MAX_QUERIES', default=20, cast=int),
+    'REPEAT_THRESHOLD': config('SLOW_QUERY_REPEAT_THRESHOLD', default=3, cast=int),
+}
+
+# Request profiling (core/profiling.py). Super admins profile a single /api/ request with
+# `X-Profile: pstats|collapsed`; SAMPLE_RATE additionally profiles that fraction of all
+# /api/ traffic. The newest MAX_PROFILES profiles are kept in DIRECTORY.
+PROFILING = {
+    'SAMPLE_RATE': config('PROFILE_SAMPLE_RATE', default=0.0, cast=float),
+    'SAMPLE_INTERVAL_MS': config('PROFILE_SAMPLE_INTERVAL_MS', default=5, cast=float),
+    'DIRECTORY': config('PROFILE_DIRECTORY', default=os.path.join(tempfile.gettempdir(), 'access-control-profiles')),
+    'MAX_PROFILES': config('PROFILE_MAX_PROFILES', default=200, cast=int),
+}
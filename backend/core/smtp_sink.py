@@ -0,0 +1,108 @@
+"""
+A local SMTP server that accepts every message and keeps it in memory, for
+exercising real SMTP delivery without a mail server:
+
+    python -m core.smtp_sink --port 1025
+    EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend EMAIL_HOST=localhost \\
+        EMAIL_PORT=1025 EMAIL_USE_TLS=False python manage.py runserver
+
+Or in-process: `sink = SMTPSink(); sink.start()`, point EMAIL_PORT at
+`sink.port`, then read `sink.messages` (email.message.Message objects).
+"""
+import argparse
+import email
+import socketserver
+import threading
+from email import policy
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of RFC 5321 for smtplib: HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.sink.connections += 1
+        self.reply('220 smtp-sink ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-smtp-sink')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 smtp-sink')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                self.server.sink.receive(sender, recipients, self.read_data())
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                if verb == 'RSET':
+                    sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+    def read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b'.\r\n', b'.\n'):
+                return b''.join(lines)
+            lines.append(line[1:] if line.startswith(b'..') else line)
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class SMTPSink:
+    def __init__(self, host='127.0.0.1', port=0, echo=False):
+        self.server = SMTPServer((host, port), SMTPHandler)
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+        self.echo = echo
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def receive(self, sender, recipients, data):
+        message = email.message_from_bytes(data, policy=policy.default)
+        with self._lock:
+            self.messages.append(message)
+        if self.echo:
+            print(f'From {sender} to {", ".join(recipients)}: {message["Subject"]}', flush=True)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    args = parser.parse_args()
+    sink = SMTPSink(args.host, args.port, echo=True)
+    print(f'SMTP sink listening on {args.host}:{sink.port}', flush=True)
+    try:
+        sink.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
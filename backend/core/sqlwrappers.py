@@ -0,0 +1,42 @@
+"""
+Database execute wrappers scoped to a request rather than to a thread.
+
+connection.execute_wrapper() wraps the calling thread's connection only.
+Under ASGI, sync views and the ORM run in sync_to_async's executor thread,
+on that thread's own connection, so a wrapper installed by async middleware
+never sees their queries. Wrappers installed with execute_wrapper() below
+are kept in a context variable, which asgiref copies into the executor
+thread, and every connection runs the ones of the context it is used in.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+_wrappers = ContextVar('sql_execute_wrappers', default=())
+
+def dispatch(execute, sql, params, many, context):
+    """The execute wrapper every connection carries; runs the current context's wrappers, outermost first"""
+    for wrapper in reversed(_wrappers.get()):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+def install(connection, **kwargs):
+    if dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, dispatch)
+
+# Connections opened from now on, in any thread
+connection_created.connect(install)
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """connection.execute_wrapper(wrapper) for every connection used by the current context"""
+    # This thread's connection may have been opened before the signal was connected
+    install(connection)
+    token = _wrappers.set(_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _wrappers.reset(token)
@@ -0,0 +1,191 @@
+import marshal
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import path
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.cache import permission_cache
+from accounts.models import User
+from . import mail, profiling
+from .mail import MailQueue
+from .metrics import registry
+from .smtp_sink import SMTPSink
+
+def users_one_by_one(request):
+    for user_id in User.objects.values_list('id', flat=True):
+        User.objects.get(pk=user_id)
+    return HttpResponse()
+
+urlpatterns = [
+    path('users/', users_one_by_one),
+]
+
+def bearer(user):
+    return {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(DEBUG=False, METRICS_TOKEN='')
+    def test_not_served_without_token_outside_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN='')
+    def test_open_in_debug_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        self.headers = bearer(User.objects.create_user(username='user', email='user@example.com', password='x'))
+        permission_cache.invalidate()
+        registry.reset()
+
+    def queries(self, route):
+        return registry._routes[(route, 'GET')].queries
+
+    def test_wsgi_request_queries_counted(self):
+        self.assertEqual(self.client.get('/api/pages/available/', headers=self.headers).status_code, 200)
+        self.assertEqual(self.queries('api/pages/available/').sum, 2)
+
+    def test_unknown_method_recorded_as_other(self):
+        for method in ('FOO', 'BAR"}'):
+            self.client.generic(method, '/api/pages/available/')
+        self.assertEqual([method for _, method in registry._routes], ['other'])
+
+    async def test_asgi_request_queries_counted(self):
+        # The DRF view runs in the executor thread, on another connection than the middleware's
+        response = await self.async_client.get('/api/pages/available/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.queries('api/pages/available/').sum, 2)
+
+@override_settings(
+    ROOT_URLCONF='core.tests',
+    SLOW_QUERY_LOG={'ENABLED': True, 'THRESHOLD_MS': 1000, 'MAX_QUERIES': 20, 'REPEAT_THRESHOLD': 3},
+)
+class SlowQueryLogMiddlewareTests(TestCase):
+    def setUp(self):
+        for index in range(3):
+            User.objects.create_user(username=f'user{index}', email=f'user{index}@example.com', password='x')
+
+    async def test_repeated_statement_flagged_under_asgi(self):
+        with self.assertLogs('core.querylog', 'WARNING') as logs:
+            await self.async_client.get('/users/')
+        [message] = logs.output
+        self.assertIn('Likely N+1 in GET /users/: 3 x SELECT', message)
+        self.assertIn('core/tests.py', message)
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(profiling, 'store', profiling.ProfileStore(directory.name, max_profiles=2))
+        self.store = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='user', email='user@example.com', password='x')
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='x', is_super_admin=True
+        )
+        self.admin_headers = {**bearer(self.admin), 'X-Profile': 'pstats'}
+
+    def test_requested_profile_refused_for_other_users(self):
+        response = self.client.get('/api/pages/available/', headers={**bearer(self.user), 'X-Profile': 'pstats'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.store.list(), [])
+
+    async def test_asgi_profile_contains_view_frames(self):
+        response = await self.async_client.get('/api/pages/available/', headers=self.admin_headers)
+        path, profile_format = self.store.artifact(response['X-Profile-Id'])
+        self.assertEqual(profile_format, 'pstats')
+        # The sync view ran in the executor thread, not on the event loop
+        functions = {function for _, _, function in marshal.loads(path.read_bytes())}
+        self.assertIn('available_pages', functions)
+
+    @override_settings(PROFILING={'SAMPLE_RATE': 1.0, 'SAMPLE_INTERVAL_MS': 1, 'DIRECTORY': '', 'MAX_PROFILES': 2})
+    def test_sampled_profiles_rotate(self):
+        for path in ('/api/pages/available/', '/api/pages/available/?n=2', '/api/auth/profile/'):
+            self.client.get(path, headers=bearer(self.user))
+        profiles = self.store.list()
+        self.assertEqual([(profile['path'], profile['trigger']) for profile in profiles], [
+            ('/api/auth/profile/', 'sampled'), ('/api/pages/available/', 'sampled'),
+        ])
+        self.assertEqual(len(list(self.store.directory.iterdir())), 4)
+
+def message(index):
+    return EmailMessage(f'Message {index}', 'Body', 'noreply@example.com', [f'user{index}@example.com'])
+
+class MailQueueTests(TestCase):
+    def setUp(self):
+        self.sink = SMTPSink().start()
+        self.addCleanup(self.sink.stop)
+        smtp = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.sink.port, EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        )
+        smtp.enable()
+        self.addCleanup(smtp.disable)
+        self.queue = MailQueue(batch_size=50, batch_wait=0.05, max_retries=2, retry_delay=0.1, idle_timeout=30)
+
+    def test_batch_sent_over_one_connection(self):
+        for index in range(10):
+            self.queue.enqueue(message(index))
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertEqual(len(self.sink.messages), 10)
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_failed_message_retried(self):
+        attempts = []
+        def flaky_connection(**kwargs):
+            attempts.append(kwargs)
+            if len(attempts) == 1:
+                raise ConnectionRefusedError
+            return get_connection(**kwargs)
+
+        with mock.patch.object(mail, 'get_connection', flaky_connection), self.assertLogs('core.mail') as logs:
+            self.queue.enqueue(message(0))
+            self.assertTrue(self.queue.flush(timeout=5))
+        self.assertEqual([sent['Subject'] for sent in self.sink.messages], ['Message 0'])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('retrying in 0.1s', logs.output[0])
+
+    def test_message_dropped_after_max_retries(self):
+        self.sink.stop()
+        started = time.monotonic()
+        with self.assertLogs('core.mail') as logs:
+            self.queue.enqueue(message(0))
+            self.assertTrue(self.queue.flush(timeout=5))
+        # Retried after 0.1 s, then 0.2 s
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual([record.getMessage() for record in logs.records], [
+            'Email to user0@example.com failed, retrying in 0.1s',
+            'Email to user0@example.com failed, retrying in 0.2s',
+            'Dropping email to user0@example.com after 3 attempts',
+        ])
+
+    @override_settings(EMAIL_QUEUE={**settings.EMAIL_QUEUE, 'ENABLED': True})
+    def test_password_reset_returns_before_delivery(self):
+        User.objects.create_user(username='user', email='user@example.com', password='x')
+        with mock.patch.object(mail, 'mail_queue', self.queue):
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post('/api/auth/password-reset/request/', {'email': 'user@example.com'})
+                self.assertEqual(response.status_code, 200)
+            # Nothing is queued until the OTP commits
+            self.assertEqual(len(callbacks), 1)
+            self.assertEqual(self.queue._queue.unfinished_tasks, 0)
+
+            callbacks[0]()
+            self.assertTrue(self.queue.flush(timeout=5))
+        [sent] = self.sink.messages
+        self.assertEqual((sent['To'], sent['Subject']), ('user@example.com', 'Password Reset OTP'))
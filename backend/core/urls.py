@@ -1,8 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
+from .metrics import metrics_view
+from .profiling import profile_detail_view, profile_list_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('accounts.urls')),
     path('api/pages/', include('pages.urls')),
+    path('api/supabase/', include('accounts.supabase_urls')),
+    path('api/profiles/', profile_list_view, name='profile-list'),
+    path('api/profiles/<str:profile_id>/', profile_detail_view, name='profile-detail'),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,177 @@
+import random
+import string
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.timezone import make_naive
+
+from accounts.models import User, UserPermission
+from accounts.permissions import ALL_PAGES, encode_permissions
+from pages.models import Comment, CommentHistory
+
+SEED_EMAIL_DOMAIN = 'seed.example.com'
+
+# Chance of each further grant on a page the user can view
+GRANT_PROBABILITY = {'create': 0.4, 'edit': 0.25, 'delete': 0.1}
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def next_id(model):
+    return (model.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+def insert_rows(model, fields, rows, chunk_size):
+    """
+    INSERT row tuples of `fields` values, prepared for the database, with one
+    executemany per chunk; skips the ORM's per-row model and value handling,
+    which costs far more than the INSERT itself
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(field).column) for field in fields)
+    sql = f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({", ".join(["%s"] * len(fields))})'
+    with connection.cursor() as cursor:
+        for chunk in chunked(rows, chunk_size):
+            cursor.executemany(sql, chunk)
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users, page permissions, comments and comment history. '
+        'The same --seed always produces the same data.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--super-admins', type=int, default=None, help='default: one per thousand users, at least one')
+        parser.add_argument('--comments-per-page', type=int, default=100)
+        parser.add_argument('--edits-per-comment', type=float, default=0.5, help='mean number of edits in each history')
+        parser.add_argument('--days', type=int, default=365, help='comments are spread over this many days')
+        parser.add_argument('--end', default='2025-01-01', help='date (UTC) of the newest comment')
+        parser.add_argument('--password', default='password', help='password of every seeded account')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=20000, help='rows per executemany INSERT')
+        parser.add_argument('--flush', action='store_true', help='empty the database first (manage.py flush)')
+    
+    def handle(self, *args, **options):
+        if options['flush']:
+            call_command('flush', interactive=False, verbosity=0)
+        if User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}').exists():
+            raise CommandError('Seed data is already present; rerun with --flush')
+        
+        try:
+            end = datetime.fromisoformat(options['end']).replace(tzinfo=timezone.utc)
+        except ValueError:
+            raise CommandError(f'Invalid --end date: {options["end"]}')
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        # Naive datetimes in the connection's time zone, which the backend adapts without converting them
+        self.end = make_naive(end, connection.timezone)
+        self.start = self.end - timedelta(days=options['days'])
+        self.timestamp = connection.ops.adapt_datetimefield_value
+        
+        started = time.monotonic()
+        with transaction.atomic():
+            user_ids, creators, editors = self.seed_users(options)
+            self.seed_comments(options, user_ids, creators, editors)
+            # Rows were inserted with explicit ids; move the id sequences past them
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [User, UserPermission, Comment, CommentHistory]):
+                    cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.monotonic() - started:.1f}s'))
+    
+    def seed_users(self, options):
+        """Create users and their permission masks; returns their ids and page -> creator/editor ids"""
+        rng = self.rng
+        timestamp = self.timestamp
+        # A random but seed-stable popularity order: the first page is viewable by most users
+        view_probability = {page: 0.9 / (rank + 1) for rank, page in enumerate(rng.sample(ALL_PAGES, len(ALL_PAGES)))}
+        super_admins = options['super_admins']
+        if super_admins is None:
+            super_admins = max(1, options['users'] // 1000)
+        
+        # A cheap PBKDF2 hash: seeding stays fast and Django upgrades it to the
+        # configured iteration count on the account's first login
+        salt = ''.join(rng.choices(string.ascii_letters + string.digits, k=22))
+        password = PBKDF2PasswordHasher().encode(options['password'], salt, iterations=1)
+        
+        first_user_id = next_id(User)
+        first_permission_id = next_id(UserPermission)
+        user_ids = []
+        creators = {page: [] for page in ALL_PAGES}
+        editors = {page: [] for page in ALL_PAGES}
+        masks = []
+        
+        def users():
+            for index in range(options['users']):
+                user_id = first_user_id + index
+                joined = timestamp(self.start + (self.end - self.start) * rng.random() / 2)
+                grants = set()
+                for page in ALL_PAGES:
+                    if rng.random() < view_probability[page]:
+                        grants.add((page, 'view'))
+                        grants.update((page, permission) for permission, chance in GRANT_PROBABILITY.items() if rng.random() < chance)
+                for page, permission in grants:
+                    if permission == 'create':
+                        creators[page].append(user_id)
+                    elif permission == 'edit':
+                        editors[page].append(user_id)
+                if grants:
+                    masks.append((first_permission_id + len(masks), user_id, encode_permissions(grants), joined, joined))
+                user_ids.append(user_id)
+                yield (
+                    user_id, password, False, f'seed{index}', 'Seed', str(index), f'seed{index}@{SEED_EMAIL_DOMAIN}',
+                    False, True, joined, index < super_admins, 0, joined, joined,
+                )
+        
+        insert_rows(User, [
+            'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name', 'email',
+            'is_staff', 'is_active', 'date_joined', 'is_super_admin', 'permissions_version', 'created_at', 'updated_at',
+        ], users(), self.chunk_size)
+        insert_rows(UserPermission, ['id', 'user', 'mask', 'created_at', 'updated_at'], masks, self.chunk_size)
+        self.stdout.write(f'users: {len(user_ids)}, permission rows: {len(masks)}')
+        return user_ids, creators, editors
+    
+    def seed_comments(self, options, everyone, creators, editors):
+        """Create comments on every page, oldest first, each with its created/updated history"""
+        rng = self.rng
+        timestamp = self.timestamp
+        total = options['comments_per_page'] * len(ALL_PAGES)
+        if not everyone:
+            return
+        span = self.end - self.start
+        edit_chance = options['edits_per_comment'] / (1 + options['edits_per_comment'])
+        
+        first_comment_id = next_id(Comment)
+        history = []
+        
+        def comments():
+            for index in range(total):
+                comment_id = first_comment_id + index
+                page = ALL_PAGES[index % len(ALL_PAGES)]
+                content = f'Comment {index} on {page}'
+                created_at = self.start + span * (index / total) + timedelta(seconds=rng.random())
+                author = rng.choice(creators[page] or everyone)
+                history.append((comment_id, '', author, timestamp(created_at), 'created'))
+                # Geometric number of edits with the requested mean
+                modified_at = created_at
+                revision = 0
+                while rng.random() < edit_chance:
+                    modified_at += (self.end - modified_at) * rng.random() / 2
+                    editor = rng.choice(editors[page]) if editors[page] and rng.random() < 0.5 else author
+                    history.append((comment_id, f'{content} (revision {revision})', editor, timestamp(modified_at), 'updated'))
+                    revision += 1
+                yield comment_id, page, content, author, timestamp(created_at), timestamp(modified_at)
+        
+        insert_rows(Comment, ['id', 'page', 'content', 'author', 'created_at', 'updated_at'], comments(), self.chunk_size)
+        insert_rows(
+            CommentHistory, ['comment', 'previous_content', 'modified_by', 'modified_at', 'action'], history, self.chunk_size
+        )
+        self.stdout.write(f'comments: {total}, history rows: {len(history)}')
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['page', '-created_at', '-id'], name='comment_page_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commenthistory',
+            index=models.Index(fields=['comment', '-modified_at'], name='history_comment_modified_idx'),
+        ),
+    ]
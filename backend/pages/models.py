@@ -25,6 +25,10 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-page listing, newest first, with id as the keyset tie-breaker
+            models.Index(fields=['page', '-created_at', '-id'], name='comment_page_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.author.email} - {self.page} - {self.content[:50]}"
@@ -42,6 +46,9 @@ class CommentHistory(models.Model):
     
     class Meta:
         ordering = ['-modified_at']
+        indexes = [
+            models.Index(fields=['comment', '-modified_at'], name='history_comment_modified_idx'),
+        ]
     
     def __str__(self):
         return f"{self.comment.id} - {self.action} by {self.modified_by.email}"
\ No newline at end of file
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from accounts.permissions import get_permission_set
 from .models import Comment, CommentHistory
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -23,30 +24,14 @@ class CommentSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return False
         
-        if request.user.is_super_admin:
-            return True
-            
-        from accounts.models import UserPermission
-        return UserPermission.objects.filter(
-            user=request.user,
-            page=obj.page,
-            permission='edit'
-        ).exists()
+        return get_permission_set(request).has(obj.page, 'edit')
     
     def get_can_delete(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
         
-        if request.user.is_super_admin:
-            return True
-            
-        from accounts.models import UserPermission
-        return UserPermission.objects.filter(
-            user=request.user,
-            page=obj.page,
-            permission='delete'
-        ).exists()
+        return get_permission_set(request).has(obj.page, 'delete')
 
 class CommentHistorySerializer(serializers.ModelSerializer):
     modified_by_name = serializers.SerializerMethodField()
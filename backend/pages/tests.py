@@ -0,0 +1,134 @@
+import base64
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.cache import permission_cache
+from accounts.models import User
+from accounts.permissions import encode_permissions, set_permission_masks
+from .models import Comment, CommentHistory
+
+PAGE = 'products-list'
+
+class CommentQueryCountTests(TestCase):
+    """The comment endpoints issue a fixed number of queries, however many rows they return"""
+
+    def setUp(self):
+        self.authors = [
+            User.objects.create_user(username=f'author{index}', email=f'author{index}@example.com', password='x')
+            for index in range(5)
+        ]
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        set_permission_masks({self.viewer.pk: encode_permissions([(PAGE, 'view')])})
+        self.viewer.refresh_from_db()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='x', is_super_admin=True
+        )
+        self.client = APIClient()
+
+    def add_comments(self, count):
+        Comment.objects.bulk_create(
+            Comment(page=PAGE, content=f'comment {index}', author=self.authors[index % len(self.authors)])
+            for index in range(count)
+        )
+
+    def add_history(self, comment, count):
+        CommentHistory.objects.bulk_create(
+            CommentHistory(
+                comment=comment, previous_content=f'version {index}', action='updated',
+                modified_by=self.authors[index % len(self.authors)],
+            )
+            for index in range(count)
+        )
+
+    def get(self, user, path):
+        # Every run starts from a cold permission cache, so each pays for the same lookups
+        permission_cache.invalidate()
+        self.client.force_authenticate(user)
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def count_queries(self, user, path):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(user, path)
+        return len(queries)
+
+    def test_comment_list(self):
+        path = f'/api/pages/{PAGE}/comments/'
+        self.add_comments(3)
+        expected = self.count_queries(self.viewer, path)
+
+        self.add_comments(27)
+        with self.assertNumQueries(expected):
+            response = self.get(self.viewer, path)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_comment_list_page_numbers(self):
+        path = f'/api/pages/{PAGE}/comments/?page=1'
+        self.add_comments(3)
+        expected = self.count_queries(self.viewer, path)
+
+        self.add_comments(27)
+        with self.assertNumQueries(expected):
+            response = self.get(self.viewer, path)
+        self.assertEqual(response.data['count'], 30)
+
+    def test_comment_history(self):
+        self.add_comments(1)
+        comment = Comment.objects.get()
+        path = f'/api/pages/comments/{comment.pk}/history/'
+        self.add_history(comment, 3)
+        expected = self.count_queries(self.admin, path)
+
+        self.add_history(comment, 27)
+        with self.assertNumQueries(expected):
+            response = self.get(self.admin, path)
+        self.assertEqual(len(response.data), 30)
+
+class CommentCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        set_permission_masks({self.viewer.pk: encode_permissions([(PAGE, 'view')])})
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        Comment.objects.bulk_create(
+            Comment(page=PAGE, content=f'comment {index}', author=self.viewer) for index in range(45)
+        )
+        # Three timestamps shared by 15 comments each, so page boundaries fall inside a run of equal created_at
+        now = timezone.now()
+        comments = list(Comment.objects.order_by('id'))
+        for index, comment in enumerate(comments):
+            comment.created_at = now + timedelta(seconds=index // 15)
+        Comment.objects.bulk_update(comments, ['created_at'])
+        self.expected = [comment.id for comment in reversed(comments)]
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_next_and_previous_cover_every_comment_once(self):
+        pages, url = [], f'/api/pages/{PAGE}/comments/'
+        while url:
+            data = self.get(url)
+            pages.append([comment['id'] for comment in data['results']])
+            url = data['next']
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        # Back from the last page
+        backwards, url = [], data['previous']
+        while url:
+            data = self.get(url)
+            backwards.append([comment['id'] for comment in data['results']])
+            url = data['previous']
+        self.assertEqual(backwards, pages[1::-1])
+
+    def test_malformed_cursor_not_found(self):
+        for cursor in ('not-base64!', base64.urlsafe_b64encode(b'yesterday|1|0').decode(),
+                       base64.urlsafe_b64encode(b'2026-10-18T00:00:00+00:00|1|2').decode()):
+            response = self.client.get(f'/api/pages/{PAGE}/comments/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
@@ -1,10 +1,21 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from .models import Comment, CommentHistory
+from .pagination import CommentCursorPagination
 from .serializers import CommentSerializer, CommentHistorySerializer
-from accounts.models import UserPermission
+from accounts.permissions import get_permission_set
+
+# Columns CommentSerializer and CommentHistorySerializer read from the related user
+USER_DISPLAY_FIELDS = ['first_name', 'last_name', 'username', 'email']
+
+def comments_with_author():
+    return Comment.objects.select_related('author').only(
+        'id', 'page', 'content', 'created_at', 'updated_at',
+        *[f'author__{field}' for field in USER_DISPLAY_FIELDS]
+    )
 
 class HasPagePermission(permissions.BasePermission):
     """
@@ -22,25 +33,32 @@ class HasPagePermission(permissions.BasePermission):
             return False
             
         # Check for view permission at minimum
-        return UserPermission.objects.filter(
-            user=request.user,
-            page=page,
-            permission__in=['view', 'edit', 'create', 'delete']
-        ).exists()
+        return get_permission_set(request).has_any(page)
 
 class CommentListCreateView(generics.ListCreateAPIView):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated, HasPagePermission]
+    pagination_class = CommentCursorPagination
+    
+    @property
+    def paginator(self):
+        """Keyset pagination by default; ?page=N keeps the page-number mode"""
+        if not hasattr(self, '_paginator'):
+            if PageNumberPagination.page_query_param in self.request.query_params:
+                self._paginator = PageNumberPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
     
     def get_queryset(self):
         page = self.kwargs['page']
-        return Comment.objects.filter(page=page).order_by('-created_at')
+        return comments_with_author().filter(page=page).order_by('-created_at', '-id')
     
     def perform_create(self, serializer):
         page = self.kwargs['page']
         
         # Check if user has create permission for this page
-        if not self.has_create_permission(self.request.user, page):
+        if not self.has_create_permission(page):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('No permission to create comments on this page')
         
@@ -54,25 +72,21 @@ class CommentListCreateView(generics.ListCreateAPIView):
             action='created'
         )
     
-    def has_create_permission(self, user, page):
-        if user.is_super_admin:
-            return True
-        return UserPermission.objects.filter(
-            user=user, 
-            page=page, 
-            permission='create'
-        ).exists()
+    def has_create_permission(self, page):
+        return get_permission_set(self.request).has(page, 'create')
 
 class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_queryset(self):
+        return comments_with_author()
+    
     def update(self, request, *args, **kwargs):
         comment = self.get_object()
         
         # Check if user has edit permission
-        if not self.has_edit_permission(request.user, comment.page):
+        if not self.has_edit_permission(comment.page):
             return Response({'error': 'No permission to edit comments on this page'}, 
                           status=status.HTTP_403_FORBIDDEN)
         
@@ -96,7 +110,7 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
         comment = self.get_object()
         
         # Check if user has delete permission
-        if not self.has_delete_permission(request.user, comment.page):
+        if not self.has_delete_permission(comment.page):
             return Response({'error': 'No permission to delete comments on this page'}, 
                           status=status.HTTP_403_FORBIDDEN)
         
@@ -110,23 +124,11 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
         
         return super().destroy(request, *args, **kwargs)
     
-    def has_edit_permission(self, user, page):
-        if user.is_super_admin:
-            return True
-        return UserPermission.objects.filter(
-            user=user, 
-            page=page, 
-            permission='edit'
-        ).exists()
+    def has_edit_permission(self, page):
+        return get_permission_set(self.request).has(page, 'edit')
     
-    def has_delete_permission(self, user, page):
-        if user.is_super_admin:
-            return True
-        return UserPermission.objects.filter(
-            user=user, 
-            page=page, 
-            permission='delete'
-        ).exists()
+    def has_delete_permission(self, page):
+        return get_permission_set(self.request).has(page, 'delete')
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -138,7 +140,10 @@ def comment_history_view(request, comment_id):
         return Response({'error': 'Only super admin can view comment history'}, 
                       status=status.HTTP_403_FORBIDDEN)
     
-    history = CommentHistory.objects.filter(comment=comment).order_by('-modified_at')
+    history = CommentHistory.objects.filter(comment=comment).select_related('modified_by').only(
+        'id', 'previous_content', 'modified_at', 'action',
+        *[f'modified_by__{field}' for field in USER_DISPLAY_FIELDS]
+    ).order_by('-modified_at')
     serializer = CommentHistorySerializer(history, many=True)
     return Response(serializer.data)
 
@@ -146,13 +151,7 @@ def comment_history_view(request, comment_id):
 @permission_classes([permissions.IsAuthenticated])
 def user_page_permissions(request, page):
     """Get current user's permissions for a specific page"""
-    if request.user.is_super_admin:
-        permissions = ['view', 'edit', 'create', 'delete']
-    else:
-        permissions = list(UserPermission.objects.filter(
-            user=request.user, 
-            page=page
-        ).values_list('permission', flat=True))
+    permissions = get_permission_set(request).for_page(page)
     
     return Response({'permissions': permissions})
 
@@ -178,7 +177,7 @@ def available_pages(request):
         return Response(pages)
     
     # Regular users can only access pages they have permissions for
-    user_pages = UserPermission.objects.filter(user=request.user).values_list('page', flat=True).distinct()
+    user_pages = get_permission_set(request).pages
     accessible_pages = [page for page in pages if page['key'] in user_pages]
     
     return Response(accessible_pages)
\ No newline at end of file
@@ -1,16 +1,55 @@
+import asyncio
 import os
+import weakref
+import httpx
 from dotenv import load_dotenv
-from supabase import create_client
+from supabase import acreate_client, create_client
+from supabase.lib.client_options import AsyncClientOptions, SyncClientOptions
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
 supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_KEY')
 
-supabase = create_client(supabase_url, supabase_key)
+# Created on first use, so importing the views does not require Supabase credentials
+supabase = None
+
+# One async client per event loop: its HTTP connection pools are bound to the loop
+_async_clients = weakref.WeakKeyDictionary()
+
+# httpx transport serving Supabase requests in-process instead of over the network
+_transport = None
+
+def use_transport(transport, url='http://supabase.stand-in', key='stand-in'):
+    """
+    Send every Supabase request through `transport` (e.g.
+    benchmarks.supabase_standin.SupabaseStandIn), or back to the network
+    with None. Clients created before the switch are dropped.
+    """
+    global supabase, supabase_url, supabase_key, _transport
+    if transport is None:
+        supabase_url, supabase_key = os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY')
+    else:
+        supabase_url, supabase_key = url, key
+    _transport = transport
+    supabase = None
+    _async_clients.clear()
 
 # Function to get the Supabase client
 def get_supabase_client():
+    global supabase
+    if supabase is None:
+        options = SyncClientOptions(httpx_client=httpx.Client(transport=_transport)) if _transport else None
+        supabase = create_client(supabase_url, supabase_key, options)
     return supabase
+
+async def get_async_supabase_client():
+    """Async Supabase client shared by every request served on the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        options = AsyncClientOptions(httpx_client=httpx.AsyncClient(transport=_transport)) if _transport else None
+        client = await acreate_client(supabase_url, supabase_key, options)
+        _async_clients[loop] = client
+    return client
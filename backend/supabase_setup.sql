@@ -32,7 +32,7 @@ CREATE TABLE IF NOT EXISTS comments (
 -- Create comment_history table
 CREATE TABLE IF NOT EXISTS comment_history (
   id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-  comment_id UUID REFERENCES comments(id) ON DELETE CASCADE,
+  comment_id UUID REFERENCES comments(id) ON DELETE SET NULL,
   previous_content TEXT,
   modified_by UUID REFERENCES users(id) ON DELETE SET NULL,
   action TEXT NOT NULL,
@@ -99,3 +99,5 @@ CREATE POLICY "Users can delete comments if they have permission" ON comments
 CREATE POLICY "Super admins can read comment history" ON comment_history
   FOR SELECT TO authenticated
   USING (EXISTS (SELECT 1 FROM users WHERE id = auth.uid() AND is_super_admin = true));
+
+-- Comment edit/delete with history in one call: supabase/migrations/20261018000000_comment_mutations_with_history.sql
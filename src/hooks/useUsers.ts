@@ -12,7 +12,6 @@ export interface User {
 }
 
 export interface UserPermission {
-  id: number;
   user: number;
   page: string;
   permission: string;
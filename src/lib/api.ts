@@ -14,6 +14,9 @@ export const clearTokens = () => {
 
 // API client with automatic token refresh
 class ApiClient {
+  // The refresh in flight, shared by every request that gets a 401 meanwhile
+  private refreshing: Promise<boolean> | null = null;
+
   private async request(url: string, options: RequestInit = {}) {
     const token = getToken();
     
@@ -30,7 +33,8 @@ class ApiClient {
 
     // If token expired, try to refresh
     if (response.status === 401 && token) {
-      const refreshed = await this.refreshToken();
+      // Another request may already have refreshed the token this one was sent with
+      const refreshed = getToken() !== token || await this.refreshToken();
       if (refreshed) {
         // Retry with new token
         config.headers = {
@@ -44,7 +48,18 @@ class ApiClient {
     return response;
   }
 
-  private async refreshToken(): Promise<boolean> {
+  // Refresh tokens are single use, so concurrent 401s must share one refresh:
+  // a second refresh with the same token would be rejected and log the user out
+  private refreshToken(): Promise<boolean> {
+    if (!this.refreshing) {
+      this.refreshing = this.sendRefresh().finally(() => {
+        this.refreshing = null;
+      });
+    }
+    return this.refreshing;
+  }
+
+  private async sendRefresh(): Promise<boolean> {
     const refreshToken = getRefreshToken();
     if (!refreshToken) return false;
 
@@ -58,12 +73,16 @@ class ApiClient {
       if (response.ok) {
         const data = await response.json();
         localStorage.setItem('access_token', data.access);
+        // Refresh tokens are rotated: the one just sent is no longer valid
+        if (data.refresh) localStorage.setItem('refresh_token', data.refresh);
         return true;
       }
     } catch (error) {
       console.error('Token refresh failed:', error);
     }
 
+    // Another tab may have rotated the token meanwhile; its new pair is still good
+    if (getRefreshToken() !== refreshToken) return true;
     clearTokens();
     return false;
   }
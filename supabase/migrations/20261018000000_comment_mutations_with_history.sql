@@ -0,0 +1,84 @@
+-- Edit or delete a comment and record its previous content in comment_history
+-- in one function call, so the API makes one round trip per mutation and the
+-- history row and the change commit or roll back together.
+
+-- Deleting a comment used to cascade to its history, taking the 'delete' row
+-- written just before it; keep the history and unlink it from the comment instead
+ALTER TABLE comment_history ALTER COLUMN comment_id DROP NOT NULL;
+ALTER TABLE comment_history DROP CONSTRAINT IF EXISTS comment_history_comment_id_fkey;
+ALTER TABLE comment_history
+  ADD CONSTRAINT comment_history_comment_id_fkey
+  FOREIGN KEY (comment_id) REFERENCES comments(id) ON DELETE SET NULL;
+
+-- The caller passes the pages it holds the edit or delete permission on (p_pages),
+-- or p_any_page for a super admin, from its cached authorization; the author of a
+-- comment may always change it. Otherwise the function raises insufficient_privilege
+-- (42501) and changes nothing.
+
+-- Returns the updated comment, or no row if it does not exist
+CREATE OR REPLACE FUNCTION update_comment_with_history(
+  p_comment_id UUID,
+  p_content TEXT,
+  p_modified_by UUID,
+  p_pages TEXT[] DEFAULT '{}',
+  p_any_page BOOLEAN DEFAULT FALSE
+)
+RETURNS SETOF comments
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_comment comments%ROWTYPE;
+BEGIN
+  SELECT * INTO v_comment FROM comments WHERE id = p_comment_id FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+  IF v_comment.author_id IS DISTINCT FROM p_modified_by AND NOT p_any_page
+     AND NOT v_comment.page = ANY(p_pages) THEN
+    RAISE EXCEPTION 'Permission denied' USING ERRCODE = 'insufficient_privilege';
+  END IF;
+
+  INSERT INTO comment_history (comment_id, previous_content, modified_by, action)
+  VALUES (v_comment.id, v_comment.content, p_modified_by, 'edit');
+
+  RETURN QUERY
+  UPDATE comments
+  SET content = p_content, updated_at = NOW()
+  WHERE id = p_comment_id
+  RETURNING *;
+END;
+$$;
+
+-- Returns the deleted comment, or no row if it does not exist
+CREATE OR REPLACE FUNCTION delete_comment_with_history(
+  p_comment_id UUID,
+  p_modified_by UUID,
+  p_pages TEXT[] DEFAULT '{}',
+  p_any_page BOOLEAN DEFAULT FALSE
+)
+RETURNS SETOF comments
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_comment comments%ROWTYPE;
+BEGIN
+  SELECT * INTO v_comment FROM comments WHERE id = p_comment_id FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+  IF v_comment.author_id IS DISTINCT FROM p_modified_by AND NOT p_any_page
+     AND NOT v_comment.page = ANY(p_pages) THEN
+    RAISE EXCEPTION 'Permission denied' USING ERRCODE = 'insufficient_privilege';
+  END IF;
+
+  INSERT INTO comment_history (comment_id, previous_content, modified_by, action)
+  VALUES (v_comment.id, v_comment.content, p_modified_by, 'delete');
+
+  RETURN QUERY
+  DELETE FROM comments
+  WHERE id = p_comment_id
+  RETURNING *;
+END;
+$$;